@@ -15,8 +15,10 @@ from logger import configure_logger
 from errors import GenericAccountConfigureError, ParameterNotFoundError
 from parameter_store import ParameterStore
 from cloudformation import CloudFormation
+from base_stack_manifest import BaseStackManifest
 from s3 import S3
 from sts import STS
+from stack_waiter import set_remaining_time
 
 # Globals taken from the lambda environment variables
 S3_BUCKET = os.environ["S3_BUCKET_NAME"]
@@ -53,8 +55,10 @@ def configure_generic_account(sts, event, region, role):
             'as the Deployment Account has not yet been bootstrapped. '
             'Have you moved your Deployment account into the deployment OU?'.format(event['account_id'])
         )
-    parameter_store_target_account.put_parameter('kms_arn', kms_arn)
-    parameter_store_target_account.put_parameter('deployment_account_id', event['deployment_account_id'])
+    parameter_store_target_account.put_parameters({
+        'kms_arn': kms_arn,
+        'deployment_account_id': event['deployment_account_id']
+    })
 
 def configure_master_account_parameters(event):
     """
@@ -75,13 +79,12 @@ def configure_deployment_account_parameters(event, role):
     """
     for region in list(set([event["deployment_account_region"]] + event["regions"])):
         parameter_store = ParameterStore(region, role)
-        for key, value in event['deployment_account_parameters'].items():
-            parameter_store.put_parameter(
-                key,
-                value
-            )
+        parameter_store.put_parameters(
+            event['deployment_account_parameters']
+        )
 
-def lambda_handler(event, _):
+def lambda_handler(event, context):
+    set_remaining_time(context.get_remaining_time_in_millis())
     sts = STS()
     role = sts.assume_cross_account_role(
         'arn:aws:iam::{0}:role/{1}'.format(
@@ -98,6 +101,8 @@ def lambda_handler(event, _):
         region=REGION_DEFAULT,
         bucket=S3_BUCKET
     )
+    # The regional stacks of all regions share a single manifest entry
+    manifest = BaseStackManifest(s3, event["deployment_account_region"])
 
     for region in list(set([event["deployment_account_region"]] + event["regions"])):
         if not event["is_deployment_account"]:
@@ -110,7 +115,8 @@ def lambda_handler(event, _):
             stack_name=None, # Stack name will be automatically defined based on event
             s3=s3,
             s3_key_path=event["full_path"],
-            account_id=event["account_id"]
+            account_id=event["account_id"],
+            manifest_entry=manifest.get_entry(event["full_path"], region)
         )
         cloudformation.create_stack()
 
@@ -18,13 +18,15 @@ import boto3
 
 from cloudformation import CloudFormation
 from s3 import S3
+from stack_waiter import set_remaining_time
 
 S3_BUCKET = os.environ["S3_BUCKET_NAME"]
 MASTER_ACCOUNT_ID = os.environ["MASTER_ACCOUNT_ID"]
 REGION_DEFAULT = os.environ["AWS_REGION"]
 
 
-def lambda_handler(event, _):
+def lambda_handler(event, context):
+    set_remaining_time(context.get_remaining_time_in_millis())
     s3 = S3(region=REGION_DEFAULT, bucket=S3_BUCKET)
 
     cloudformation = CloudFormation(
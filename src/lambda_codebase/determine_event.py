@@ -12,8 +12,32 @@ from parameter_store import ParameterStore
 from cache import Cache
 from event import Event
 from organizations import Organizations
+from organization_snapshot import OrganizationSnapshot
+from s3 import S3
 
 REGION_DEFAULT = os.environ["AWS_REGION"]
+S3_BUCKET = os.environ["S3_BUCKET_NAME"]
+
+
+def determine_account_path(parsed_event, s3):
+    """
+    Resolves the OU path of the destination and patches the move into
+    the persisted Organization snapshot so later runs start from it
+    """
+    OrganizationSnapshot.move_account(
+        s3,
+        parsed_event.account_id,
+        parsed_event.destination_ou_id
+    )
+
+    if parsed_event.moved_to_root:
+        return "ROOT"
+    return parsed_event.organizations.build_account_path(
+        parsed_event.destination_ou_id,
+        [],  # Initial empty array to hold OU Path,
+        Cache()
+    )
+
 
 def lambda_handler(event, _):
     parameters = ParameterStore(region=REGION_DEFAULT, role=boto3)
@@ -27,14 +51,13 @@ def lambda_handler(event, _):
         organizations=organizations,
         account_id=account_id
     )
-    cache = Cache()
-
-    account_path = "ROOT" if parsed_event.moved_to_root else parsed_event.organizations.build_account_path(
-        parsed_event.destination_ou_id,
-        [],  # Initial empty array to hold OU Path,
-        cache
+    s3 = S3(
+        region=REGION_DEFAULT,
+        bucket=S3_BUCKET
     )
 
+    account_path = determine_account_path(parsed_event, s3)
+
     if parsed_event.moved_to_root or parsed_event.moved_to_protected:
         return parsed_event.create_output_object(account_path)
 
@@ -21,10 +21,14 @@ class Event:
     """
     def __init__(self, event, parameter_store, organizations, account_id):
         self.parameter_store = parameter_store
+        parameters = parameter_store.fetch_parameters([
+            'config',
+            'target_regions',
+            'deployment_account_region',
+            'cross_account_access_role'
+        ])
         self.config = ast.literal_eval('{0}'.format(
-            parameter_store.fetch_parameter(
-                'config'
-            )
+            parameters['config']
         ))
         self.account_id = account_id
         self.organizations = organizations
@@ -44,12 +48,10 @@ class Event:
                 'requestParameters').get('destinationParentId')
         self.moved_to_protected = 1 if self.destination_ou_id in self.protected_ou_list else 0
         self.regions = ast.literal_eval(
-            parameter_store.fetch_parameter('target_regions')
+            parameters['target_regions']
         )
-        self.deployment_account_region = parameter_store.fetch_parameter(
-            'deployment_account_region')
-        self.cross_account_access_role = parameter_store.fetch_parameter(
-            'cross_account_access_role')
+        self.deployment_account_region = parameters['deployment_account_region']
+        self.cross_account_access_role = parameters['cross_account_access_role']
         self.set_destination_ou_name()
 
 
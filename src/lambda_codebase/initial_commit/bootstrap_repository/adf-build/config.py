@@ -14,6 +14,8 @@ from logger import configure_logger
 from parameter_store import ParameterStore
 
 ADF_VERSION = os.environ["ADF_VERSION"]
+S3_BUCKET_NAME = os.environ["S3_BUCKET"]
+BOOTSTRAP_CONCURRENCY_DEFAULT = 20
 LOGGER = configure_logger(__name__)
 
 
@@ -38,6 +40,7 @@ class Config:
         self.protected = None
         self.target_regions = None
         self.cross_account_access_role = None
+        self.bootstrap_concurrency = None
         self._load_config_file()
 
     def store_config(self):
@@ -87,6 +90,15 @@ class Config:
         if not isinstance(self.target_regions, list):
             self.target_regions = [self.target_regions]
 
+        try:
+            self.bootstrap_concurrency = int(self.bootstrap_concurrency)
+        except (TypeError, ValueError):
+            self.bootstrap_concurrency = 0
+        if self.bootstrap_concurrency < 1:
+            raise InvalidConfigError(
+                'bootstrap-concurrency should be a whole number of 1 or greater'
+            )
+
     def _load_config_file(self):
         """
         Loads the adfconfig.yml file and executes _parse_config
@@ -113,41 +125,45 @@ class Config:
         self.notification_endpoint = self.config.get(
             'main-notification-endpoint')[0].get('target')
         self.notification_channel = None if self.notification_type == 'email' else self.notification_endpoint
+        self.bootstrap_concurrency = os.environ.get(
+            'ADF_BOOTSTRAP_CONCURRENCY',
+            self.config.get('bootstrap-concurrency', BOOTSTRAP_CONCURRENCY_DEFAULT)
+        )
 
         self._validate()
 
     def _store_cross_region_config(self):
         """
-        Stores cross_account_access_role Parameter
-        in Parameter Store on the master account
+        Stores cross_account_access_role and bootstrap_templates_bucket
+        Parameters in Parameter Store on the master account
         in deployment account main region.
         """
         self.client_deployment_region = ParameterStore(
             self.deployment_account_region,
             boto3
         )
-        self.client_deployment_region.put_parameter(
-            'adf_version',
-            ADF_VERSION
-        )
-        self.client_deployment_region.put_parameter(
-            'cross_account_access_role',
-            self.cross_account_access_role
-        )
+        self.client_deployment_region.put_parameters({
+            'adf_version': ADF_VERSION,
+            'cross_account_access_role': self.cross_account_access_role,
+            'bootstrap_templates_bucket': S3_BUCKET_NAME
+        })
 
     def _store_config(self):
         """
         Stores the required configuration in Parameter Store on
         The master account in us-east-1.
         """
-        for key, value in self.__dict__.items():
+        self.parameters_client.put_parameters({
+            key: str(value)
+            for key, value in self.__dict__.items()
             if key not in (
-                    "client",
-                    "client_deployment_region",
-                    "parameters_client",
-                    "config_contents",
-                    "config_path",
-                    "notification_endpoint",
-                    "notification_type"
-            ):
-                self.parameters_client.put_parameter(key, str(value))
+                "client",
+                "client_deployment_region",
+                "parameters_client",
+                "config_contents",
+                "config_path",
+                "notification_endpoint",
+                "notification_type",
+                "bootstrap_concurrency"
+            )
+        })
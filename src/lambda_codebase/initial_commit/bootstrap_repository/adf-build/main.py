@@ -6,16 +6,21 @@ is executed from within AWS CodeBuild in the Master Account
 """
 
 import os
-from thread import PropagatingThread
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import boto3
 
 from botocore.exceptions import ClientError
 from logger import configure_logger
-from cache import Cache
+from client_factory import set_max_pool_connections
 from cloudformation import CloudFormation
+from stack_plan import StackPlan
+from base_stack_manifest import BaseStackManifest
 from parameter_store import ParameterStore
 from organizations import Organizations
+from organization_snapshot import OrganizationSnapshot
 from stepfunctions import StepFunctions
 from errors import GenericAccountConfigureError, ParameterNotFoundError
 from sts import STS
@@ -28,9 +33,29 @@ S3_BUCKET_NAME = os.environ["S3_BUCKET"]
 REGION_DEFAULT = os.environ["AWS_REGION"]
 ACCOUNT_ID = os.environ["MASTER_ACCOUNT_ID"]
 DEPLOYMENT_ACCOUNT_S3_BUCKET_NAME = os.environ["DEPLOYMENT_ACCOUNT_BUCKET"]
+PLAN_MODE = os.environ.get("ADF_BOOTSTRAP_PLAN", "False") == "True"
+PLAN_REPORT_KEY = 'adf-plan/bootstrap-plan.json'
+# Plan runs sync the bootstrap repository here rather than over the live templates
+PLAN_TEMPLATES_PREFIX = 'adf-plan/templates'
 LOGGER = configure_logger(__name__)
 
 
+class AccountBootstrapResult:
+    """
+    The outcome of bootstrapping a single account, returned
+    by each worker in place of a raw thread
+    """
+    BOOTSTRAPPED = 'BOOTSTRAPPED'
+    SKIPPED = 'SKIPPED'
+    FAILED = 'FAILED'
+
+    def __init__(self, account_id, status, reason=None, error=None):
+        self.account_id = account_id
+        self.status = status
+        self.reason = reason
+        self.error = error
+
+
 def is_account_in_invalid_state(ou_id, config):
     """
     Check if Account is sitting in the root
@@ -78,15 +103,12 @@ def update_deployment_account_output_parameters(
         region, deployment_account_role
     )
 
-    for key, value in cloudformation.get_stack_regional_outputs().items():
-        deployment_account_parameter_store.put_parameter(
-            "/cross_region/{0}/{1}".format(key, region),
-            value
-        )
-        parameter_store.put_parameter(
-            "/cross_region/{0}/{1}".format(key, region),
-            value
-        )
+    outputs = {
+        "/cross_region/{0}/{1}".format(key, region): value
+        for key, value in cloudformation.get_stack_regional_outputs().items()
+    }
+    deployment_account_parameter_store.put_parameters(outputs)
+    parameter_store.put_parameters(outputs)
 
 
 def prepare_deployment_account(sts, deployment_account_id, config):
@@ -106,23 +128,20 @@ def prepare_deployment_account(sts, deployment_account_id, config):
             region,
             deployment_account_role
         )
-        deployment_account_parameter_store.put_parameter(
-            'organization_id', os.environ["ORGANIZATION_ID"]
-        )
+        deployment_account_parameter_store.put_parameters({
+            'organization_id': os.environ["ORGANIZATION_ID"]
+        })
 
     deployment_account_parameter_store = ParameterStore(
         config.deployment_account_region,
         deployment_account_role
     )
-    deployment_account_parameter_store.put_parameter(
-        'adf_version', os.environ["ADF_VERSION"]
-    )
-    deployment_account_parameter_store.put_parameter(
-        'adf_log_level', os.environ["ADF_LOG_LEVEL"]
-    )
-    deployment_account_parameter_store.put_parameter(
-        'deployment_account_bucket', DEPLOYMENT_ACCOUNT_S3_BUCKET_NAME
-    )
+    parameters = {
+        'adf_version': os.environ["ADF_VERSION"],
+        'adf_log_level': os.environ["ADF_LOG_LEVEL"],
+        'deployment_account_bucket': DEPLOYMENT_ACCOUNT_S3_BUCKET_NAME,
+        'bootstrap_templates_bucket': S3_BUCKET_NAME
+    }
     if '@' not in config.notification_endpoint:
         config.notification_channel = config.notification_endpoint
         config.notification_endpoint = "arn:aws:lambda:{0}:{1}:function:SendSlackNotification".format(
@@ -136,41 +155,107 @@ def prepare_deployment_account(sts, deployment_account_id, config):
             'notification_channel'
     ):
         if getattr(config, item) is not None:
-            deployment_account_parameter_store.put_parameter(
-                '/notification_endpoint/main' if item == 'notification_channel' else item,
-                str(getattr(config, item))
-            )
+            parameters[
+                '/notification_endpoint/main' if item == 'notification_channel' else item
+            ] = str(getattr(config, item))
+    deployment_account_parameter_store.put_parameters(parameters)
 
     return deployment_account_role
 
+def get_base_stacks(account_id, role, config, s3, account_path, manifest=None):
+    """
+    Returns the CloudFormation objects of the base stacks of an account,
+    the global stack in the deployment account region comes first. When
+    a BaseStackManifest is passed the stacks are looked up in it rather
+    than resolved for each account
+    """
+    return [
+        CloudFormation(
+            region=region,
+            deployment_account_region=config.deployment_account_region,
+            role=role,
+            wait=True,
+            stack_name=None,
+            s3=s3,
+            s3_key_path=account_path,
+            account_id=account_id,
+            manifest_entry=manifest.get_entry(account_path, region) if manifest else None
+        )
+        # Each account has a single base stack per region, which is described
+        # once and memoized, a StackIndex would list every stack in the region
+        # to save that one call.
+        # Clients are created up front as boto3 Sessions are not thread safe
+        for region in [config.deployment_account_region] + sorted(
+            set(config.target_regions) - set([config.deployment_account_region])
+        )
+    ]
+
+
+def create_base_stacks(
+        account_id,
+        role,
+        config,
+        s3,
+        account_path,
+        on_complete=None,
+        regional_executor=None,
+        manifest=None):
+    """
+    Creates or updates the global base stack in the deployment account
+    region and, once that has succeeded, the regional base stacks
+    in all other target regions through a StackPlan, which creates
+    their change sets concurrently before executing them together.
+    on_complete is called with each CloudFormation object from the
+    calling thread as soon as its stack is up to date, so a region that
+    fails does not hold back the others. Pass a shared
+    regional_executor to bound the number of regional stacks being
+    planned across many accounts.
+    """
+    global_stack, *regional_stacks = get_base_stacks(
+        account_id,
+        role,
+        config,
+        s3,
+        account_path,
+        manifest
+    )
+    global_stack.create_stack()
+    if on_complete:
+        on_complete(global_stack)
+
+    if not regional_stacks:
+        return
+    stack_plan = StackPlan(regional_stacks, executor=regional_executor)
+    stack_plan.plan(raise_on_failure=False)
+    stack_plan.apply(on_complete=on_complete)
+
+
 def worker_thread(
         account_id,
         sts,
         config,
         s3,
-        cache):
+        snapshot,
+        regional_executor=None,
+        manifest=None):
     """
-    The Worker thread function that is created for each account
+    The Worker function that is executed from the pool for each account
     in which CloudFormation create_stack is called
     """
-    LOGGER.debug("Starting new worker thread for %s", account_id)
+    LOGGER.debug("Starting new worker for %s", account_id)
 
-    organizations = Organizations(
-        role=boto3,
-        account_id=account_id
-    )
-    ou_id = organizations.get_parent_info().get("ou_parent_id")
+    ou_id = snapshot.get_parent_info(account_id).get("ou_parent_id")
 
     account_state = is_account_in_invalid_state(ou_id, config.config)
     if account_state:
         LOGGER.info("%s %s", account_id, account_state)
-        return
+        return AccountBootstrapResult(
+            account_id,
+            AccountBootstrapResult.SKIPPED,
+            reason=account_state
+        )
 
-    account_path = organizations.build_account_path(
-        ou_id,
-        [],  # Initial empty array to hold OU Path,
-        cache
-    )
+    account_path = snapshot.get_ou_path(ou_id)
     try:
         role = ensure_generic_account_can_be_setup(
             sts,
@@ -178,28 +263,199 @@ def worker_thread(
             account_id
         )
 
-        # Regional base stacks can be updated after global
-        for region in list(set([config.deployment_account_region] + config.target_regions)):
-            cloudformation = CloudFormation(
-                region=region,
-                deployment_account_region=config.deployment_account_region,
-                role=role,
-                wait=True,
-                stack_name=None,
-                s3=s3,
-                s3_key_path=account_path,
-                account_id=account_id
-            )
-
-            cloudformation.create_stack()
+        create_base_stacks(
+            account_id,
+            role,
+            config,
+            s3,
+            account_path,
+            regional_executor=regional_executor,
+            manifest=manifest
+        )
 
     except GenericAccountConfigureError as generic_account_error:
         LOGGER.info(generic_account_error)
-        return
+        return AccountBootstrapResult(
+            account_id,
+            AccountBootstrapResult.SKIPPED,
+            reason=str(generic_account_error)
+        )
+
+    return AccountBootstrapResult(account_id, AccountBootstrapResult.BOOTSTRAPPED)
+
+
+def bootstrap_accounts(account_ids, sts, config, s3, snapshot, manifest=None):
+    """
+    Bootstraps the accounts through a bounded pool of workers sized by
+    bootstrap-concurrency so the number of threads, boto3 clients and
+    in-flight API calls stays fixed regardless of the size of the Organization.
+    The regional stacks of all accounts share a second pool of the same size.
+    Raises the first error encountered once every account has been processed.
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=config.bootstrap_concurrency) as executor, \
+            ThreadPoolExecutor(max_workers=config.bootstrap_concurrency) as regional_executor:
+        futures = {
+            executor.submit(
+                worker_thread,
+                account_id,
+                sts,
+                config,
+                s3,
+                snapshot,
+                regional_executor,
+                manifest
+            ): account_id
+            for account_id in account_ids
+        }
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as error: # pylint: disable=W0703
+                LOGGER.error("%s - Bootstrapping failed: %s", futures[future], error)
+                results.append(
+                    AccountBootstrapResult(
+                        futures[future],
+                        AccountBootstrapResult.FAILED,
+                        error=error
+                    )
+                )
+
+    LOGGER.info(
+        "Bootstrap complete - %s bootstrapped, %s skipped, %s failed",
+        len([r for r in results if r.status == AccountBootstrapResult.BOOTSTRAPPED]),
+        len([r for r in results if r.status == AccountBootstrapResult.SKIPPED]),
+        len([r for r in results if r.status == AccountBootstrapResult.FAILED])
+    )
+    for result in results:
+        if result.status == AccountBootstrapResult.FAILED:
+            raise result.error
+    return results
+
+
+def plan_account(account_id, sts, config, s3, snapshot, manifest=None):
+    """
+    Returns the result of preparing an account to be planned and the
+    base stacks to plan for it, accounts that would be skipped by a
+    bootstrap have none
+    """
+    ou_id = snapshot.get_parent_info(account_id).get("ou_parent_id")
+    account_state = is_account_in_invalid_state(ou_id, config.config)
+    if account_state:
+        return AccountBootstrapResult(
+            account_id,
+            AccountBootstrapResult.SKIPPED,
+            reason=account_state
+        ), []
+    try:
+        role = ensure_generic_account_can_be_setup(sts, config, account_id)
+    except GenericAccountConfigureError as generic_account_error:
+        return AccountBootstrapResult(
+            account_id,
+            AccountBootstrapResult.SKIPPED,
+            reason=str(generic_account_error)
+        ), []
+    return AccountBootstrapResult(account_id, AccountBootstrapResult.BOOTSTRAPPED), get_base_stacks(
+        account_id,
+        role,
+        config,
+        s3,
+        snapshot.get_ou_path(ou_id),
+        manifest
+    )
+
+
+def plan_accounts(account_ids, sts, config, s3, snapshot, stacks=None, manifest=None):
+    """
+    Creates the change sets of the base stacks of all accounts without
+    executing them and returns the report of what a bootstrap would do,
+    the change sets are deleted once they have been described
+    """
+    results = []
+    stacks = list(stacks or [])
+    with ThreadPoolExecutor(max_workers=config.bootstrap_concurrency) as executor:
+        futures = {
+            executor.submit(plan_account, account_id, sts, config, s3, snapshot, manifest): account_id
+            for account_id in account_ids
+        }
+        for future in as_completed(futures):
+            result, account_stacks = future.result()
+            results.append(result)
+            stacks.extend(account_stacks)
+        stack_plan = StackPlan(stacks, executor=executor)
+        changes = stack_plan.plan(raise_on_failure=False)
+        stack_plan.discard()
+
+    summary = {}
+    for change in changes:
+        summary[change.action] = summary.get(change.action, 0) + 1
+    LOGGER.info("Bootstrap plan - %s", json.dumps(summary, sort_keys=True))
+    return {
+        'created_at': int(time.time()),
+        'summary': summary,
+        'skipped_accounts': [
+            {'account_id': result.account_id, 'reason': result.reason}
+            for result in results
+            if result.status == AccountBootstrapResult.SKIPPED
+        ],
+        'stacks': [change.to_dict() for change in changes]
+    }
+
+
+def plan(config):
+    """
+    Plans the base stacks of the master account and of every account in
+    the Organization without changing them and writes the report to the
+    bootstrap bucket, used when ADF_BOOTSTRAP_PLAN is True. The templates
+    planned are read from the copy of the bootstrap repository synced to
+    PLAN_TEMPLATES_PREFIX, the live templates are left as they are
+    """
+    parameter_store = ParameterStore(REGION_DEFAULT, boto3)
+    deployment_account_id = parameter_store.fetch_parameter('deployment_account_id')
+    s3 = S3(
+        region=REGION_DEFAULT,
+        bucket=S3_BUCKET_NAME
+    )
+    templates = S3(
+        region=REGION_DEFAULT,
+        bucket=S3_BUCKET_NAME,
+        prefix=PLAN_TEMPLATES_PREFIX
+    )
+    snapshot = OrganizationSnapshot.fetch(
+        Organizations(role=boto3, account_id=deployment_account_id),
+        s3
+    )
+    report = plan_accounts(
+        snapshot.get_account_ids(),
+        STS(),
+        config,
+        templates,
+        snapshot,
+        stacks=[CloudFormation(
+            region=config.deployment_account_region,
+            deployment_account_region=config.deployment_account_region,
+            role=boto3,
+            wait=True,
+            stack_name=None,
+            s3=templates,
+            s3_key_path='adf-build',
+            account_id=ACCOUNT_ID
+        )],
+        manifest=BaseStackManifest(templates, config.deployment_account_region)
+    )
+    s3.write_object(PLAN_REPORT_KEY, json.dumps(report, indent=2))
+    LOGGER.info("Bootstrap plan written to s3://%s/%s", S3_BUCKET_NAME, PLAN_REPORT_KEY)
+    return report
+
 
 def main():
     scp = SCP()
     config = Config()
+    # Account workers and regional stack workers share the same clients
+    set_max_pool_connections(config.bootstrap_concurrency * 2)
+    if PLAN_MODE:
+        plan(config)
+        return
     config.store_config()
 
     try:
@@ -211,7 +467,19 @@ def main():
             role=boto3,
             account_id=deployment_account_id
         )
-        scp.apply(organizations, parameter_store, config.config)
+        s3 = S3(
+            region=REGION_DEFAULT,
+            bucket=S3_BUCKET_NAME
+        )
+        # Account moves are patched into the persisted snapshot as they
+        # happen, OUs created or renamed since are picked up once it expires
+        snapshot = OrganizationSnapshot.fetch(organizations, s3)
+        scp.apply(
+            organizations,
+            parameter_store,
+            config.config,
+            organization_mapping=snapshot.get_organization_map()
+        )
 
         sts = STS()
         deployment_account_role = prepare_deployment_account(
@@ -220,17 +488,7 @@ def main():
             config=config
         )
 
-        cache = Cache()
-        ou_id = organizations.get_parent_info().get("ou_parent_id")
-        account_path = organizations.build_account_path(
-            ou_id=ou_id,
-            account_path=[],
-            cache=cache
-        )
-        s3 = S3(
-            region=REGION_DEFAULT,
-            bucket=S3_BUCKET_NAME
-        )
+        account_path = snapshot.get_account_path(deployment_account_id)
 
         # Updating the stack on the master account in deployment region
         cloudformation = CloudFormation(
@@ -245,43 +503,34 @@ def main():
         )
         cloudformation.create_stack()
 
-        # First Setup/Update the Deployment Account in all regions (KMS Key and S3 Bucket + Parameter Store values)
-        for region in list(set([config.deployment_account_region] + config.target_regions)):
-            cloudformation = CloudFormation(
-                region=region,
-                deployment_account_region=config.deployment_account_region,
-                role=deployment_account_role,
-                wait=True,
-                stack_name=None,
-                s3=s3,
-                s3_key_path=account_path,
-                account_id=deployment_account_id
-            )
+        # Base stacks are resolved once per OU path for all accounts
+        manifest = BaseStackManifest(s3, config.deployment_account_region)
 
-            cloudformation.create_stack()
-
-            update_deployment_account_output_parameters(
+        # First Setup/Update the Deployment Account in all regions (KMS Key and S3 Bucket + Parameter Store values)
+        create_base_stacks(
+            deployment_account_id,
+            deployment_account_role,
+            config,
+            s3,
+            account_path,
+            on_complete=lambda cloudformation: update_deployment_account_output_parameters(
                 deployment_account_region=config.deployment_account_region,
-                region=region,
+                region=cloudformation.region,
                 deployment_account_role=deployment_account_role,
                 cloudformation=cloudformation
-            )
-
-        threads = []
-        account_ids = organizations.get_account_ids()
-        for account_id in [account for account in account_ids if account != deployment_account_id]:
-            thread = PropagatingThread(target=worker_thread, args=(
-                account_id,
-                sts,
-                config,
-                s3,
-                cache
-            ))
-            thread.start()
-            threads.append(thread)
+            ),
+            manifest=manifest
+        )
 
-        for thread in threads:
-            thread.join()
+        account_ids = snapshot.get_account_ids()
+        bootstrap_accounts(
+            [account for account in account_ids if account != deployment_account_id],
+            sts,
+            config,
+            s3,
+            snapshot,
+            manifest
+        )
 
         step_functions = StepFunctions(
             role=deployment_account_role,
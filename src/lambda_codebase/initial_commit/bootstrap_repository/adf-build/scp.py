@@ -32,7 +32,7 @@ class SCP():
     def _trim_scp_file_name(scp):
         return scp[1:][:-8] if scp[1:][:-8] == '/' else scp[2:][:-9]
 
-    def apply(self, organizations, parameter_store, config): #pylint: disable=R0912, R0915
+    def apply(self, organizations, parameter_store, config, organization_mapping=None): #pylint: disable=R0912, R0915
         status = organizations.get_organization_info()
 
         if status.get('feature_set') != 'ALL':
@@ -41,7 +41,9 @@ class SCP():
 
         organizations.enable_scp()
         scps = SCP._find_all()
-        organization_mapping = organizations.get_organization_map({'/': organizations.get_ou_root_id()})
+        organization_mapping = organization_mapping or organizations.get_organization_map(
+            {'/': organizations.get_ou_root_id()}
+        )
         scp_keep_full_access = config.get('scp')
 
         try:
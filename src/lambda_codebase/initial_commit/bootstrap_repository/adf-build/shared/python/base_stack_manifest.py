@@ -0,0 +1,68 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Base Stack Manifest module used throughout the ADF
+
+Every account in the same Organizational Unit resolves the same base
+stack name, template and parameters. The manifest resolves them once
+per OU path and global/regional stack and shares the result with all
+threads, so the work grows with the number of distinct OUs rather than
+with the number of accounts and regions.
+"""
+
+import hashlib
+
+from cache import Cache
+from cloudformation import StackProperties
+from logger import configure_logger
+
+LOGGER = configure_logger(__name__)
+
+
+class ManifestEntry:
+    """The base stack resolved for an OU path in either the
+    deployment account region (global) or any other region (regional)
+    """
+
+    def __init__(self, stack_name, template_url, template_body, parameters):
+        self.stack_name = stack_name
+        self.template_url = template_url
+        self.template_body = template_body
+        self.template_hash = hashlib.sha256(
+            template_body.encode('utf-8')
+        ).hexdigest() if template_body is not None else None
+        self.parameters = parameters
+
+
+class BaseStackManifest:
+    """Class used for resolving the base stacks of OU paths once per run
+    """
+
+    def __init__(self, s3, deployment_account_region):
+        self.s3 = s3
+        self.deployment_account_region = deployment_account_region
+        self.cache = Cache()
+
+    def get_entry(self, ou_path, region):
+        properties = StackProperties(
+            region=region,
+            deployment_account_region=self.deployment_account_region,
+            stack_name=None,
+            s3=self.s3,
+            s3_key_path=ou_path
+        )
+        return self.cache.get_or_load(
+            (ou_path, properties.stack_name),
+            lambda: BaseStackManifest._load_entry(properties)
+        )
+
+    @staticmethod
+    def _load_entry(properties):
+        template_url = properties.get_template_url()
+        LOGGER.debug('Resolved %s for %s', template_url, properties.s3_key_path)
+        return ManifestEntry(
+            stack_name=properties.stack_name,
+            template_url=template_url,
+            template_body=properties.template_body,
+            parameters=properties.get_parameters() if template_url else []
+        )
@@ -2,21 +2,102 @@
 # SPDX-License-Identifier: MIT-0
 
 """
-Used as a cache for AWS Organizations calls within threads.
+Used as a cache for AWS calls within threads.
 A single instance of this class is passed into all threads to act
-as a cache
+as a cache. Access is locked, concurrent misses on the same key
+are collapsed into a single load and entries can optionally
+expire (ttl) or be evicted least recently used first (max_size).
 """
 
+import threading
+import time
+from collections import OrderedDict
+
 
 class Cache:
-    def __init__(self):
-        self._stash = {}
+    def __init__(self, ttl=None, max_size=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0
+        self._stash = OrderedDict()  # key -> (value, expires_at)
+        self._loading = {}  # key -> threading.Event set once the load completes
+        self._lock = threading.Lock()
 
-    def check(self, key):
+    def _get(self, key):
+        """
+        Returns (True, value) if key is present and not expired,
+        must be called while holding the lock
+        """
         try:
-            return self._stash[key]
+            value, expires_at = self._stash[key]
         except KeyError:
+            return False, None
+        if expires_at is not None and expires_at <= time.time():
+            del self._stash[key]
+            return False, None
+        self._stash.move_to_end(key)
+        return True, value
+
+    def check(self, key):
+        with self._lock:
+            found, value = self._get(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
             return None
 
-    def add(self, key, value):
-        self._stash[key] = value
+    def add(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        with self._lock:
+            self._stash[key] = (value, time.time() + ttl if ttl is not None else None)
+            self._stash.move_to_end(key)
+            while self.max_size is not None and len(self._stash) > self.max_size:
+                self._stash.popitem(last=False)
+
+    def remove(self, key):
+        with self._lock:
+            self._stash.pop(key, None)
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Returns the cached value for key, calling loader() to populate it
+        on a miss. Threads that miss on a key which is already being
+        loaded wait for that load rather than calling loader() themselves.
+        ttl can also be a function that returns the ttl for the loaded value.
+        """
+        while True:
+            with self._lock:
+                found, value = self._get(key)
+                if found:
+                    self.hits += 1
+                    return value
+                loading = self._loading.get(key)
+                if loading is None:
+                    self.misses += 1
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading this key, once it is done check again
+            loading.wait()
+
+        start = time.time()
+        try:
+            value = loader()
+            self.add(key, value, ttl(value) if callable(ttl) else ttl)
+            return value
+        finally:
+            with self._lock:
+                self.load_time += time.time() - start
+                del self._loading[key]
+            loading.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._stash),
+                "hits": self.hits,
+                "misses": self.misses,
+                "load_time": self.load_time
+            }
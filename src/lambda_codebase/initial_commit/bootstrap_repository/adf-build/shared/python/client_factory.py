@@ -0,0 +1,83 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Client Factory module used throughout the ADF
+
+boto3 clients are expensive to create (endpoint resolution and loading of
+the service model) but are thread safe once created, unlike boto3 resources
+which should not be shared between threads and are therefore not offered here. This module creates
+each client once per credentials, service and region and shares it between
+all classes and threads for the lifetime of the process.
+"""
+
+import threading
+
+import boto3
+from botocore.config import Config
+from cache import Cache
+from logger import configure_logger
+
+LOGGER = configure_logger(__name__)
+# Clients are keyed by the access key of their credentials, refreshed role
+# sessions get new keys, so entries expire with the session (1 hour) and
+# the least recently used are evicted to bound the cache in warm Lambdas
+CLIENT_CACHE = Cache(ttl=3600, max_size=500)
+# Creating clients from a single boto3 Session is not thread safe
+_CREATE_LOCK = threading.Lock()
+_POOL_CONFIG = {"max_pool_connections": 10}
+
+
+def set_max_pool_connections(max_pool_connections):
+    """
+    Sizes the connection pool of clients created from here on, this should
+    match the number of threads that share a client (eg: bootstrap-concurrency)
+    """
+    _POOL_CONFIG["max_pool_connections"] = max(int(max_pool_connections), 10)
+
+
+def _identity(role):
+    """
+    Returns a key for the credentials of role, which is either
+    the boto3 module (default credentials) or a boto3 Session
+    """
+    if role is boto3:
+        return 'default'
+    credentials = role.get_credentials()
+    return credentials.access_key if credentials else id(role)
+
+
+def _config(config):
+    pool_config = Config(max_pool_connections=_POOL_CONFIG["max_pool_connections"])
+    return config.merge(pool_config) if config else pool_config
+
+
+def _create(role, factory, service, region, config):
+    with _CREATE_LOCK:
+        LOGGER.debug('Creating %s %s in %s', service, factory, region)
+        return getattr(role, factory)(
+            service,
+            region_name=region,
+            config=_config(config)
+        )
+
+
+def _get(role, factory, service, region, config):
+    return CLIENT_CACHE.get_or_load(
+        (
+            _identity(role),
+            factory,
+            service,
+            region,
+            id(config) if config else None,
+            _POOL_CONFIG["max_pool_connections"]
+        ),
+        lambda: _create(role, factory, service, region, config)
+    )
+
+
+def get_client(role, service, region=None, config=None):
+    """
+    Returns a shared client for service in region, config objects
+    should be module level constants as they form part of the key
+    """
+    return _get(role, 'client', service, region, config)
@@ -4,17 +4,36 @@
 """CloudFormation module used throughout the ADF
 """
 
-import re
 import os
+import re
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
 from botocore.exceptions import WaiterError, ClientError
+from cache import Cache
+from client_factory import get_client
 from errors import InvalidTemplateError
 from logger import configure_logger
-from paginator import paginator
+from parameter_store import ParameterStore
+from stack_index import StackIndex
+from stack_waiter import StackWaiter
 
 
 LOGGER = configure_logger(__name__)
 STACK_TERMINATION_PROTECTION = os.environ.get('TERMINATION_PROTECTION', False)
+# The digest a stack was last deployed with is kept in Parameter Store in
+# its own account and region, stack tags would be copied onto every resource
+TEMPLATE_DIGEST_PARAMETER = '/template_digest/{0}'
+INCLUDE_LOCATION = re.compile(r'''["']?Location["']?\s*:\s*["']?([^"'\s,}]+)''')
+# Template summaries and validation results only depend on the
+# template body, so are keyed by its hash
+TEMPLATE_SUMMARY_CACHE = Cache(max_size=100)
+VALIDATED_TEMPLATE_CACHE = Cache(max_size=100)
+VALIDATED_TEMPLATE_PREFIX = 'adf-cache/validated-templates'
+# Larger templates have to be passed to CloudFormation by their S3 URL
+TEMPLATE_BODY_LIMIT = 51200
 
 class StackProperties:
     clean_stack_status = [
@@ -32,6 +51,10 @@ class StackProperties:
         'UPDATE_ROLLBACK_COMPLETE',
         'REVIEW_IN_PROGRESS'
     ]
+    stable_stack_status = [
+        'CREATE_COMPLETE',
+        'UPDATE_COMPLETE'
+    ]
 
     def __init__(
             self,
@@ -47,6 +70,7 @@ class StackProperties:
         self.ou_name = self.s3_key_path.split(
             '/')[-1] if self.s3_key_path else None
         self.s3 = s3
+        self.template_body = None
         self.stack_name = stack_name or self._get_stack_name()
 
     def _get_geo_prefix(self):
@@ -65,9 +89,10 @@ class StackProperties:
         )
 
     def get_template_url(self):
-        return self.s3.fetch_s3_url(
+        key, self.template_body = self.s3.fetch_s3_object(
             self._create_template_path(self.s3_key_path)
         )
+        return self.s3.get_object_url(key) if key else []
 
     def get_parameters(self):
         try:
@@ -98,12 +123,19 @@ class CloudFormation(StackProperties):
             s3_key_path=None,
             parameters=None,
             account_id=None, # Used for logging visibility
+            stack_index=None,
+            manifest_entry=None,
     ):
-        self.client = role.client('cloudformation', region_name=region)
+        self.role = role
+        self.client = get_client(role, 'cloudformation', region)
         self.wait = wait
         self.parameters = parameters
         self.account_id = account_id
         self.template_url = template_url
+        self.template_digest = None
+        self.template_hash = None
+        self._stack_description = None
+        self.stack_index = stack_index
         StackProperties.__init__(
             self,
             region=region,
@@ -112,47 +144,60 @@ class CloudFormation(StackProperties):
             s3=s3,
             s3_key_path=s3_key_path
         )
+        if manifest_entry:
+            # Resolved once for all accounts in the same OU by a BaseStackManifest
+            self.stack_name = manifest_entry.stack_name
+            self.template_url = manifest_entry.template_url
+            self.template_body = manifest_entry.template_body
+            self.template_hash = manifest_entry.template_hash
+            self.parameters = manifest_entry.parameters
 
     def validate_template(self):
+        """
+        Validates the template once per distinct template body, results are
+        kept in memory and persisted in the S3 bucket of the stack if it has one
+        """
+        try:
+            template_hash = self._get_template_hash()
+        except (ClientError, KeyError, ValueError) as error:
+            LOGGER.warning("Unable to read %s, validating without cache: %s", self.template_url, error)
+            return self._validate_template()
+        return VALIDATED_TEMPLATE_CACHE.get_or_load(
+            template_hash,
+            lambda: self._load_template_validation(template_hash)
+        )
+
+    def _validate_template(self):
         try:
-            return self.client.validate_template(TemplateURL=self.template_url)
+            return self.client.validate_template(**self._get_template_argument())
         except ClientError as error:
             raise InvalidTemplateError("{0}: {1}".format(self.template_url, error)) from None
 
-    def _wait_stack(self, waiter_type):
-        waiter = self.client.get_waiter(waiter_type)
-
-        LOGGER.info(
-            '%s - Waiting for CloudFormation stack: %s in %s to reach %s',
-            self.account_id,
-            self.stack_name,
-            self.region,
-            waiter_type
-        )
+    def _load_template_validation(self, template_hash):
+        key = '{0}/{1}.json'.format(VALIDATED_TEMPLATE_PREFIX, template_hash)
+        if self.s3:
+            try:
+                return json.loads(self.s3.read_object(key))
+            except (ClientError, ValueError):
+                LOGGER.debug("No persisted validation result for %s", self.template_url)
+        result = self._validate_template()
+        result.pop('ResponseMetadata', None)
+        if self.s3:
+            try:
+                self.s3.write_object(key, json.dumps(result))
+            except ClientError:
+                LOGGER.debug("Unable to persist validation result for %s", self.template_url, exc_info=1)
+        return result
 
-        waiter.wait(
-            StackName=self.stack_name,
-            WaiterConfig={
-                'Delay': 10,
-                'MaxAttempts': 45
-            }
-        )
+    def _wait_stack(self, waiter_type):
+        waiter = StackWaiter()
+        waiter.add_stack(self, waiter_type)
+        waiter.wait()
 
     def _wait_change_set(self):
-        waiter = self.client.get_waiter('change_set_create_complete')
-
-        LOGGER.debug(
-            '%s - Determine CloudFormation Change Set: %s in %s',
-            self.account_id, self.stack_name, self.region)
-
-        waiter.wait(
-            StackName=self.stack_name,
-            ChangeSetName=self.stack_name,
-            WaiterConfig={
-                'Delay': 10,
-                'MaxAttempts': 20
-            }
-        )
+        waiter = StackWaiter()
+        waiter.add_change_set(self)
+        waiter.wait()
 
     def _get_waiter_type(self):
         return 'stack_update_complete' if self._get_change_set_type(
@@ -161,14 +206,199 @@ class CloudFormation(StackProperties):
     def _get_change_set_type(self):
         return 'UPDATE' if self.get_stack_status() else 'CREATE'
 
-    def _describe_change_set(self):
-        try:
-            return self.client.describe_change_set(
+    def _describe_change_set(self, description=None):
+        """
+        Returns the description of the change set with the changes of
+        every page, description is its first page if already read
+        """
+        description = description or self.client.describe_change_set(
+            ChangeSetName=self.stack_name,
+            StackName=self.stack_name
+        )
+        changes = list(description.get('Changes', []))
+        next_token = description.get('NextToken')
+        while next_token:
+            page = self.client.describe_change_set(
                 ChangeSetName=self.stack_name,
-                StackName=self.stack_name
+                StackName=self.stack_name,
+                NextToken=next_token
             )
-        except ClientError:
+            changes.extend(page.get('Changes', []))
+            next_token = page.get('NextToken')
+        description = dict(description, Changes=changes)
+        description.pop('NextToken', None)
+        return description
+
+    def _get_template_body(self):
+        """
+        Reads the template from S3 once, through the S3 class of the stack
+        if the template lives in its bucket, or with the role otherwise
+        """
+        if self.template_body is None:
+            key = self.s3.get_key(self.template_url) if self.s3 else None
+            if key is not None:
+                self.template_body = self.s3.read_object(key)
+            else:
+                bucket, key = urlparse(self.template_url).path.lstrip('/').split('/', 1)
+                response = get_client(self.role, 's3').get_object(Bucket=bucket, Key=key)
+                self.template_body = response['Body'].read().decode('utf-8')
+        return self.template_body
+
+    def _get_template_argument(self):
+        """
+        Returns the template as TemplateBody when it is small enough to be
+        passed inline, so CloudFormation does not fetch it from S3 for every
+        stack, or as TemplateURL otherwise
+        """
+        try:
+            body = self._get_template_body()
+        except (ClientError, KeyError, ValueError) as error:
+            LOGGER.debug("Unable to read %s, passing it by URL: %s", self.template_url, error)
+            return {'TemplateURL': self.template_url}
+        if len(body.encode('utf-8')) <= TEMPLATE_BODY_LIMIT:
+            return {'TemplateBody': body}
+        return {'TemplateURL': self.template_url}
+
+    def _get_template_hash(self):
+        if self.template_hash is None:
+            self.template_hash = hashlib.sha256(
+                self._get_template_body().encode('utf-8')
+            ).hexdigest()
+        return self.template_hash
+
+    def _get_template_summary(self, template_hash):
+        return TEMPLATE_SUMMARY_CACHE.get_or_load(
+            template_hash,
+            lambda: self.client.get_template_summary(**self._get_template_argument())
+        )
+
+    def _get_included_etags(self, body):
+        """
+        Returns the ETag of each file the template includes with AWS::Include
+        as the stack changes with them, raises ValueError for an include
+        whose location is not a literal S3 URI or URL
+        """
+        if 'AWS::Include' not in body:
+            return {}
+        locations = INCLUDE_LOCATION.findall(body)
+        if not locations:
+            raise ValueError('Unable to find the files included by {0}'.format(self.template_url))
+        etags = {}
+        for location in locations:
+            url = urlparse(location)
+            if '${' in location or url.scheme not in ('s3', 'https'):
+                raise ValueError('Unable to resolve the included file {0}'.format(location))
+            if url.scheme == 's3':
+                bucket, key = url.netloc, url.path.lstrip('/')
+            elif url.netloc.startswith('s3'):
+                bucket, key = url.path.lstrip('/').split('/', 1)
+            else:
+                bucket, key = url.netloc.split('.s3')[0], url.path.lstrip('/')
+            client = self.s3.client if self.s3 and self.s3.bucket == bucket else get_client(self.role, 's3')
+            etags[location] = client.head_object(Bucket=bucket, Key=key)['ETag']
+        return etags
+
+    def _get_template_digest(self, parameters):
+        """
+        Returns a digest of the template and its parameters, including
+        the values of the Parameter Store parameters it resolves and the
+        files it includes as those can change without the template changing.
+        """
+        if isinstance(parameters, str):
+            # Parameters read from a params file in S3
+            parameters = json.loads(parameters)
+        template_hash = self._get_template_hash()
+        summary = self._get_template_summary(template_hash)
+        values = {
+            parameter['ParameterKey']: parameter.get('DefaultValue')
+            for parameter in summary.get('Parameters', [])
+        }
+        values.update({
+            parameter['ParameterKey']: parameter.get('ParameterValue')
+            for parameter in parameters
+        })
+        ssm_parameters = {
+            parameter['ParameterKey']: values[parameter['ParameterKey']]
+            for parameter in summary.get('Parameters', [])
+            if parameter.get('ParameterType', '').startswith('AWS::SSM::Parameter::Value')
+            and values[parameter['ParameterKey']]
+        }
+        resolved = ParameterStore(self.region, self.role).fetch_parameters(
+            list(ssm_parameters.values()),
+            ignore_missing=True
+        ) if ssm_parameters else {}
+        return hashlib.sha256(json.dumps({
+            'template': template_hash,
+            'parameters': values,
+            'resolved': {key: resolved.get(name) for key, name in ssm_parameters.items()},
+            'included': self._get_included_etags(self._get_template_body()),
+            'termination_protection': str(STACK_TERMINATION_PROTECTION)
+        }, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _stack_is_up_to_date(self, parameters):
+        """
+        Determines if the stack is stable and was last deployed with the
+        same template digest, in which case no change set is required
+        """
+        try:
+            self.template_digest = self._get_template_digest(parameters)
+        except (ClientError, KeyError, ValueError) as error:
+            LOGGER.warning(
+                "%s - Unable to determine the template digest of %s, creating a change set: %s",
+                self.account_id, self.stack_name, error)
+            return False
+        if self._describe_stack().get('StackStatus') not in StackProperties.stable_stack_status:
             return False
+        name = TEMPLATE_DIGEST_PARAMETER.format(self.stack_name)
+        try:
+            stored = ParameterStore(self.region, self.role).fetch_parameters(
+                [name],
+                ignore_missing=True
+            ).get(name)
+        except ClientError as error:
+            LOGGER.warning(
+                "%s - Unable to read the template digest of %s, creating a change set: %s",
+                self.account_id, self.stack_name, error)
+            return False
+        return stored == self.template_digest
+
+    def record_template_digest(self):
+        """
+        Stores the template digest the stack is deployed with, it is only
+        trusted while the stack is in a stable status so can be stored as
+        soon as the change set is executed
+        """
+        if not self.template_digest:
+            return
+        try:
+            ParameterStore(self.region, self.role).put_parameter(
+                TEMPLATE_DIGEST_PARAMETER.format(self.stack_name),
+                self.template_digest
+            )
+        except ClientError as error:
+            LOGGER.warning(
+                "%s - Unable to store the template digest of %s: %s",
+                self.account_id, self.stack_name, error)
+
+    def _submit_change_set(self, change_set_type):
+        self.validate_template()
+        self.client.create_change_set(
+            StackName=self.stack_name,
+            Parameters=self.parameters if self.parameters is not None else self.get_parameters(),
+            Capabilities=[
+                'CAPABILITY_NAMED_IAM',
+            ],
+            Tags=[
+                {
+                    'Key': 'createdBy',
+                    'Value': 'ADF'
+                }
+            ],
+            ChangeSetName=self.stack_name,
+            ChangeSetType=change_set_type,
+            **self._get_template_argument()
+        )
+        self._invalidate_stack_description()
 
     def _create_change_set(self):
         """Creates a Cloudformation change set from a template
@@ -176,36 +406,27 @@ class CloudFormation(StackProperties):
         try:
             self.template_url = self.template_url if self.template_url is not None else self.get_template_url()
             if self.template_url:
-                self.validate_template()
-                self.client.create_change_set(
-                    StackName=self.stack_name,
-                    TemplateURL=self.template_url,
-                    Parameters=self.parameters if self.parameters is not None else self.get_parameters(),
-                    Capabilities=[
-                        'CAPABILITY_NAMED_IAM',
-                    ],
-                    Tags=[
-                        {
-                            'Key': 'createdBy',
-                            'Value': 'ADF'
-                        }
-                    ],
-                    ChangeSetName=self.stack_name,
-                    ChangeSetType=self._get_change_set_type())
-
+                self._submit_change_set(self._get_change_set_type())
                 self._wait_change_set()
                 return True
             return False
         except WaiterError as error:
-            err = error.last_response
-            if CloudFormation._change_set_failed_due_to_empty(err["Status"], err["StatusReason"]):
-                LOGGER.debug("%s - The submitted information does not contain changes.", self.account_id)
-                self._delete_change_set()
-                return False
+            return self._handle_change_set_error(error)
 
-            LOGGER.error("%s - ERROR: %s", self.account_id, err["StatusReason"], exc_info=1)
+    def _handle_change_set_error(self, error):
+        """
+        Deletes a change set that failed to create, returns False if it
+        failed as it was empty and raises the error otherwise
+        """
+        err = error.last_response or {}
+        if CloudFormation._change_set_failed_due_to_empty(err.get("Status"), err.get("StatusReason", "")):
+            LOGGER.debug("%s - The submitted information does not contain changes.", self.account_id)
             self._delete_change_set()
-            raise
+            return False
+
+        LOGGER.error("%s - ERROR: %s", self.account_id, err.get("StatusReason", error), exc_info=1)
+        self._delete_change_set()
+        raise error
 
 
     @staticmethod
@@ -216,6 +437,7 @@ class CloudFormation(StackProperties):
 
     def _update_stack_termination_protection(self):
         try:
+            self._invalidate_stack_description()
             return self.client.update_termination_protection(
                 EnableTerminationProtection=STACK_TERMINATION_PROTECTION == "True",
                 StackName=self.stack_name
@@ -238,7 +460,7 @@ class CloudFormation(StackProperties):
                 self.account_id, self.stack_name)
             pass
 
-    def _execute_change_set(self, waiter):
+    def _execute_change_set(self, waiter, stack_waiter=None):
         LOGGER.info(
             '%s - Executing Cloudformation Change Set with name: %s',
             self.account_id,
@@ -248,15 +470,83 @@ class CloudFormation(StackProperties):
             ChangeSetName=self.stack_name,
             StackName=self.stack_name
         )
-        if self.wait:
+        self._invalidate_stack_description()
+        if self.wait and stack_waiter:
+            stack_waiter.add_stack(self, waiter)
+        elif self.wait:
             self._wait_stack(waiter)
 
+    def _requires_change_set(self):
+        """
+        Resolves the template and parameters of the stack, returns False
+        if there is no template or the stack is up to date with it
+        """
+        self.template_url = self.template_url if self.template_url is not None else self.get_template_url()
+        if not self.template_url:
+            return False
+        self.parameters = self.parameters if self.parameters is not None else self.get_parameters()
+        if self._stack_is_up_to_date(self.parameters):
+            LOGGER.info(
+                '%s - Stack %s in %s is up to date with its template digest, skipping.',
+                self.account_id, self.stack_name, self.region)
+            return False
+        return True
+
     def create_stack(self):
+        """
+        Creates or updates the stack, use a StackPlan to create or
+        update many stacks at once
+        """
+        if not self._requires_change_set():
+            return
         waiter = self._get_waiter_type()
         create_change_set = self._create_change_set()
         if create_change_set:
             self._execute_change_set(waiter)
             self._update_stack_termination_protection()
+        self.record_template_digest()
+
+    def plan_change_set(self, stack_waiter):
+        """
+        First phase of a StackPlan, submits the change set and adds it to
+        stack_waiter without waiting on it. Returns the change set type and
+        its StackWaiter target, or None if the stack is already up to date
+        """
+        if not self._requires_change_set():
+            return None
+        change_set_type = self._get_change_set_type()
+        self._submit_change_set(change_set_type)
+        return change_set_type, stack_waiter.add_change_set(self)
+
+    def resolve_change_set(self, target):
+        """
+        Returns the description of a planned change set once its StackWaiter
+        target is done, False if it was empty and has been deleted
+        """
+        if target.error is None:
+            return self._describe_change_set(target.last_response)
+        return self._handle_change_set_error(target.error)
+
+    def apply_change_set(self, change_set_type, stack_waiter):
+        """
+        Second phase of a StackPlan, executes the planned change set
+        and adds the stack to stack_waiter
+        """
+        self._execute_change_set(
+            'stack_update_complete' if change_set_type == 'UPDATE' else 'stack_create_complete',
+            stack_waiter
+        )
+        self._update_stack_termination_protection()
+        self.record_template_digest()
+
+    def discard_change_set(self, change_set_type):
+        """
+        Deletes a planned change set that will not be executed, along with
+        the empty stack CloudFormation created to hold a CREATE change set
+        """
+        self._delete_change_set()
+        if change_set_type == 'CREATE':
+            self.delete_stack(self.stack_name)
 
     def get_stack_regional_outputs(self):
         return {
@@ -264,44 +554,112 @@ class CloudFormation(StackProperties):
             "s3_regional_bucket": self.get_stack_output("DeploymentFrameworkRegionalS3Bucket")
         }
 
+    def get_base_stack_names(self):
+        """
+        Returns the names of the base stacks in the region, listed with a
+        server side status filter so deleted stacks are not returned
+        """
+        return StackIndex(
+            self.client,
+            StackProperties.clean_stack_status
+        ).get_stack_names('adf-(global|regional)-base')
+
     def delete_all_base_stacks(self):
-        for stack in paginator(self.client.list_stacks):
-            if bool(
-                    re.search(
-                        'adf-(global|regional)-base',
-                        stack.get('StackName'))):
-                if stack.get(
-                        'StackStatus') in StackProperties.clean_stack_status:
-                    LOGGER.warning(
-                        'Removing Stack: %s',
-                        stack.get('StackName'))
-                    self.delete_stack(stack.get('StackName'))
+        delete_base_stacks([self])
 
-    def get_stack_output(self, value):
+    def _describe_stack(self):
+        """
+        Returns the description of the stack, memoized until the stack is
+        mutated through this class ({} if the stack does not exist)
+        """
+        if self._stack_description is not None:
+            return self._stack_description
+        if self.stack_index and not self.stack_index.has_stack(self.stack_name):
+            self._stack_description = {}
+            return self._stack_description
         try:
-            response = self.client.describe_stacks(
+            self._stack_description = self.client.describe_stacks(
                 StackName=self.stack_name
-            )
-            return [item.get('OutputValue') for item in response.get('Stacks')
-                    [0].get('Outputs') if item.get('OutputKey') == value][0]
-        except BaseException:
+            )['Stacks'][0]
+        except (IndexError, KeyError):
+            self._stack_description = {}
+        except ClientError as error:
+            if 'does not exist' not in str(error):
+                LOGGER.warning("%s - Attempted to describe stack %s but it failed.", self.account_id, self.stack_name)
+                return {}
+            self._stack_description = {}
+        return self._stack_description
+
+    def set_stack_description(self, stack):
+        """
+        Memoizes a description of the stack obtained elsewhere (eg: by a StackWaiter)
+        """
+        self._stack_description = stack
+
+    def _invalidate_stack_description(self):
+        self._stack_description = None
+        # The index no longer reflects a stack this class has mutated
+        self.stack_index = None
+
+    def get_stack_output(self, value):
+        outputs = [
+            item.get('OutputValue')
+            for item in self._describe_stack().get('Outputs', [])
+            if item.get('OutputKey') == value
+        ]
+        if not outputs:
             LOGGER.warning("%s - Attempted to get stack output from %s but it failed.", self.account_id, self.stack_name)
             return None  # Return None if describe stack call fails
+        return outputs[0]
+
+    def get_stack_parameters(self):
+        return {
+            item.get('ParameterKey'): item.get('ParameterValue')
+            for item in self._describe_stack().get('Parameters', [])
+        }
 
     def get_stack_status(self):
-        try:
-            stack = self.client.describe_stacks(
-                StackName=self.stack_name
-            )
-            return stack['Stacks'][0]['StackStatus']
-        except BaseException:
+        if self._stack_description is None and self.stack_index:
+            return self.stack_index.get_stack_status(self.stack_name)
+        status = self._describe_stack().get('StackStatus')
+        if status is None:
             LOGGER.debug("%s - Attempted to get stack status from %s but it failed.", self.account_id, self.stack_name)
-            return None  # Return None if the stack does not exist
+        return status  # Return None if the stack does not exist
 
-    def delete_stack(self, stack_name):
+    def delete_stack(self, stack_name, stack_waiter=None):
         self.stack_name = stack_name
+        self._invalidate_stack_description()
         self.client.delete_stack(
             StackName=self.stack_name
         )
-        if self.wait:
+        if self.wait and stack_waiter:
+            stack_waiter.add_stack(self, 'stack_delete_complete', stack_name=stack_name)
+        elif self.wait:
             self._wait_stack('stack_delete_complete')
+
+
+def delete_base_stacks(stacks):
+    """
+    Deletes the base stacks in the regions of the CloudFormation objects
+    passed. All regional stacks are deleted at once and tracked by a single
+    StackWaiter before the global stacks, which may export values the
+    regional stacks import, are deleted the same way
+    """
+    with ThreadPoolExecutor(max_workers=max(len(stacks), 1)) as executor:
+        base_stacks = [
+            (cloudformation, stack_name)
+            for cloudformation, stack_names in zip(
+                stacks,
+                executor.map(lambda cloudformation: cloudformation.get_base_stack_names(), stacks)
+            )
+            for stack_name in stack_names
+        ]
+    for prefix in ('adf-regional-base', 'adf-global-base'):
+        stack_waiter = StackWaiter()
+        for cloudformation, stack_name in base_stacks:
+            if stack_name.startswith(prefix):
+                LOGGER.warning(
+                    '%s - Removing Stack: %s in %s',
+                    cloudformation.account_id, stack_name, cloudformation.region)
+                cloudformation.delete_stack(stack_name, stack_waiter)
+        stack_waiter.wait()
@@ -5,6 +5,7 @@
 """CodePipeline module used throughout the ADF
 """
 
+from client_factory import get_client
 from logger import configure_logger
 
 LOGGER = configure_logger(__name__)
@@ -15,7 +16,7 @@ class CodePipeline():
     """
 
     def __init__(self, role, region):
-        self.client = role.client('codepipeline', region_name=region)
+        self.client = get_client(role, 'codepipeline', region)
 
     def get_pipeline_status(self, pipeline_name):
         """Gets a Pipeline Execution Status
@@ -5,6 +5,7 @@
 """
 
 import json
+from client_factory import get_client
 from logger import configure_logger
 
 LOGGER = configure_logger(__name__)
@@ -14,7 +15,7 @@ class IAM:
     """
 
     def __init__(self, role):
-        self.client = role.client('iam')
+        self.client = get_client(role, 'iam')
         self.role_name = None
         self.policy_name = None
         self.policy = None
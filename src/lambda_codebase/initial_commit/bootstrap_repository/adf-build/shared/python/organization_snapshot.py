@@ -0,0 +1,306 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Organization Snapshot module used throughout the ADF
+
+Crawls the Organization once from the root and keeps the resulting
+tree of Organizational Units and Accounts in memory so lookups such as
+account -> OU path or OU path -> accounts do not require any further
+calls to AWS Organizations.
+
+Snapshots can be persisted to the bootstrap S3 bucket so that
+subsequent runs start from a warm snapshot rather than crawling
+again, until the snapshot is older than its TTL. Account moves are
+patched into the persisted snapshot with a read-modify-write that is
+conditional on the ETag read, so concurrent writers never overwrite
+each other's changes and retry instead.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+from errors import RootOUIDError
+from logger import configure_logger
+from organizations import ORGANIZATIONS_CONCURRENCY
+
+LOGGER = configure_logger(__name__)
+SNAPSHOT_KEY = 'adf-cache/organization-snapshot.json'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_TTL = int(os.environ.get('ADF_ORGANIZATION_SNAPSHOT_TTL', 3600))
+SNAPSHOT_WRITE_ATTEMPTS = 5
+WRITE_CONFLICT_CODES = ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409')
+
+
+class OrganizationSnapshot:
+    """Class used for modeling an in memory snapshot of the Organization
+    """
+
+    def __init__(self, root_id, crawled_at=None):
+        self.root_id = root_id
+        self.crawled_at = crawled_at or time.time()
+        self.ous = {}  # ou_id -> {"Name", "ParentId"}
+        self.accounts = {}  # account_id -> {"Id", "Name", "Status", "ParentId"}
+        self._ou_paths = {root_id: ''}
+        self._path_ous = {'': root_id}
+        self._parent_accounts = {root_id: []}
+
+    @classmethod
+    def crawl(cls, organizations):
+        """
+        Builds a snapshot with a breadth first walk of the Organization
+        starting from the root, one level of Organizational Units at a time.
+        The accounts and child OUs of all parents in a level are listed
+        concurrently and added to the snapshot from the calling thread
+        """
+        snapshot = cls(organizations.get_ou_root_id())
+        parents = [snapshot.root_id]
+        with ThreadPoolExecutor(max_workers=ORGANIZATIONS_CONCURRENCY) as executor:
+            while parents:
+                listed = executor.map(
+                    lambda parent_id: (
+                        list(organizations.get_accounts_for_parent(parent_id)),
+                        list(organizations.get_child_ous(parent_id))
+                    ),
+                    parents
+                )
+                children = []
+                for parent_id, (accounts, child_ous) in zip(parents, listed):
+                    for account in accounts:
+                        snapshot.add_account(account, parent_id)
+                    for ou in child_ous:
+                        snapshot.add_ou(ou['Id'], ou['Name'], parent_id)
+                        children.append(ou['Id'])
+                parents = children
+        LOGGER.info(
+            'Organization snapshot contains %s Organizational Units and %s Accounts',
+            len(snapshot.ous),
+            len(snapshot.accounts)
+        )
+        return snapshot
+
+    @classmethod
+    def fetch(cls, organizations, s3, ttl=SNAPSHOT_TTL):
+        """
+        Returns the persisted snapshot if it is still fresh, otherwise
+        crawls the Organization and persists the new snapshot unless the
+        persisted one was changed while crawling, in which case an account
+        may have moved after it was listed and the snapshot is invalidated
+        """
+        etag, content = cls._read(s3)
+        snapshot = cls._from_content(content, ttl)
+        if snapshot:
+            return snapshot
+        snapshot = cls.crawl(organizations)
+        if not snapshot._write(s3, etag):
+            LOGGER.info('Persisted Organization snapshot changed while crawling')
+            OrganizationSnapshot.invalidate(s3)
+        return snapshot
+
+    @classmethod
+    def load(cls, s3, ttl=SNAPSHOT_TTL):
+        """
+        Loads the persisted snapshot from S3, returns None if it does not
+        exist, was written by another version or is older than the TTL
+        """
+        return cls._from_content(cls._read(s3)[1], ttl)
+
+    @classmethod
+    def move_account(cls, s3, account_id, parent_id, attempts=SNAPSHOT_WRITE_ATTEMPTS):
+        """
+        Patches an account that was moved to a new parent into the
+        persisted snapshot. Each attempt reads the snapshot, moves the
+        account and writes it back only if its ETag is unchanged, so a
+        concurrent write makes it start over. The snapshot is invalidated
+        when the account or parent is unknown to it (eg: a new OU) or
+        when every attempt conflicted.
+        """
+        for _ in range(attempts):
+            etag, content = cls._read(s3)
+            snapshot = cls._from_content(content, SNAPSHOT_TTL)
+            if snapshot is None:
+                # The next reader crawls the Organization regardless
+                return
+            if account_id not in snapshot.accounts or parent_id not in snapshot._ou_paths:
+                LOGGER.info('Account %s or its new parent %s is not in the Organization snapshot',
+                            account_id, parent_id)
+                break
+            snapshot._move_account(account_id, parent_id)
+            if snapshot._write(s3, etag):
+                return
+            LOGGER.info('Persisted Organization snapshot changed while moving %s, retrying',
+                        account_id)
+        OrganizationSnapshot.invalidate(s3)
+
+    @staticmethod
+    def _read(s3):
+        """
+        Returns the (etag, content) of the persisted snapshot, both None
+        if it does not exist and content None if it cannot be parsed
+        """
+        try:
+            etag, body = s3.read_object_with_etag(SNAPSHOT_KEY)
+        except ClientError:
+            LOGGER.info('No persisted Organization snapshot could be loaded')
+            return None, None
+        try:
+            return etag, json.loads(body)
+        except ValueError:
+            LOGGER.info('Persisted Organization snapshot could not be parsed')
+            return etag, None
+
+    @classmethod
+    def _from_content(cls, content, ttl):
+        if content is None:
+            return None
+        if content.get('version') != SNAPSHOT_VERSION:
+            LOGGER.info('Persisted Organization snapshot has an outdated version')
+            return None
+        if time.time() - content['crawled_at'] > ttl:
+            LOGGER.info('Persisted Organization snapshot has expired')
+            return None
+
+        snapshot = cls(content['root_id'], crawled_at=content['crawled_at'])
+        parents = [snapshot.root_id]
+        while parents:
+            children = []
+            for parent_id in parents:
+                for ou_id, ou in content['ous'].items():
+                    if ou['ParentId'] == parent_id:
+                        snapshot.add_ou(ou_id, ou['Name'], parent_id)
+                        children.append(ou_id)
+            parents = children
+        for account in content['accounts'].values():
+            snapshot.add_account(account, account['ParentId'])
+        return snapshot
+
+    def _dumps(self):
+        return json.dumps({
+            'version': SNAPSHOT_VERSION,
+            'crawled_at': self.crawled_at,
+            'root_id': self.root_id,
+            'ous': self.ous,
+            'accounts': self.accounts
+        })
+
+    def save(self, s3):
+        s3.write_object(SNAPSHOT_KEY, self._dumps())
+
+    def _write(self, s3, etag):
+        """
+        Writes the snapshot only if the persisted one still has etag, or
+        does not exist when etag is None, returns False if it has changed
+        """
+        try:
+            s3.write_object(
+                SNAPSHOT_KEY,
+                self._dumps(),
+                if_match=etag,
+                if_none_match=None if etag else '*'
+            )
+        except ClientError as error:
+            if error.response['Error']['Code'] in WRITE_CONFLICT_CODES:
+                return False
+            raise
+        return True
+
+    @staticmethod
+    def invalidate(s3):
+        try:
+            s3.delete_object(SNAPSHOT_KEY)
+        except ClientError:
+            LOGGER.warning('Unable to invalidate the persisted Organization snapshot')
+
+    @staticmethod
+    def _normalize_path(path):
+        return str(path).strip('/')
+
+    def add_ou(self, ou_id, name, parent_id):
+        path = '/'.join(
+            [p for p in (self._ou_paths[parent_id], name) if p]
+        )
+        self.ous[ou_id] = {"Name": name, "ParentId": parent_id}
+        self._ou_paths[ou_id] = path
+        self._path_ous[path] = ou_id
+        self._parent_accounts.setdefault(ou_id, [])
+
+    def add_account(self, account, parent_id):
+        self.accounts[account['Id']] = {
+            "Id": account['Id'],
+            "Name": account.get('Name'),
+            "Status": account.get('Status'),
+            "ParentId": parent_id
+        }
+        self._parent_accounts.setdefault(parent_id, []).append(account['Id'])
+
+    def _move_account(self, account_id, parent_id):
+        account = self.accounts[account_id]
+        self._parent_accounts[account['ParentId']].remove(account_id)
+        self.add_account(account, parent_id)
+
+    def get_parent_info(self, account_id):
+        parent_id = self.accounts[account_id]['ParentId']
+        return {
+            "ou_parent_id": parent_id,
+            "ou_parent_type": "ROOT" if parent_id == self.root_id else "ORGANIZATIONAL_UNIT"
+        }
+
+    def describe_ou_name(self, ou_id):
+        try:
+            return self.ous[ou_id]['Name']
+        except KeyError:
+            raise RootOUIDError("OU is the Root of the Organization")
+
+    def get_ou_path(self, ou_id):
+        """Returns the path to an OU from the root of the Organization
+        """
+        return self._ou_paths[ou_id]
+
+    def get_account_path(self, account_id):
+        return self.get_ou_path(self.accounts[account_id]['ParentId'])
+
+    def get_ou_id(self, path):
+        try:
+            return self._path_ous[OrganizationSnapshot._normalize_path(path)]
+        except KeyError:
+            raise Exception(
+                "Path {0} failed to return an Organizational Unit".format(path)
+            )
+
+    def get_accounts_for_parent(self, parent_id):
+        return [
+            self.accounts[account_id]
+            for account_id in self._parent_accounts.get(parent_id, [])
+        ]
+
+    def dir_to_ou(self, path):
+        return self.get_accounts_for_parent(self.get_ou_id(path))
+
+    def describe_account(self, account_id):
+        try:
+            return self.accounts[str(account_id)]
+        except KeyError:
+            raise Exception(
+                "Account {0} was not found in the Organization".format(account_id)
+            )
+
+    def get_account_ids(self):
+        account_ids = []
+        for account in self.accounts.values():
+            if not account.get('Status') == 'ACTIVE':
+                LOGGER.warning('Account %s is not an Active AWS Account', account['Id'])
+                continue
+            account_ids.append(account['Id'])
+        return account_ids
+
+    def get_organization_map(self):
+        """
+        Returns a map of OU path to OU id in the same format
+        as Organizations.get_organization_map
+        """
+        return {
+            path or '/': ou_id
+            for path, ou_id in self._path_ous.items()
+        }
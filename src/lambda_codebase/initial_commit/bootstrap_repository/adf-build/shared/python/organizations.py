@@ -4,15 +4,21 @@
 """Organizations module used throughout the ADF
 """
 
+import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 from botocore.config import Config
 from botocore.exceptions import ClientError
+from client_factory import get_client
 from errors import RootOUIDError
 from logger import configure_logger
 from paginator import paginator
 
 LOGGER = configure_logger(__name__)
+# Organizations allows few requests per second, parents are
+# listed concurrently within this bound and throttles are retried
+ORGANIZATIONS_CONCURRENCY = int(os.environ.get('ADF_ORGANIZATIONS_CONCURRENCY', 4))
 
 
 class Organizations: # pylint: disable=R0904
@@ -22,7 +28,8 @@ class Organizations: # pylint: disable=R0904
     _config = Config(retries=dict(max_attempts=30))
 
     def __init__(self, role, account_id=None):
-        self.client = role.client(
+        self.client = get_client(
+            role,
             'organizations',
             config=Organizations._config)
         self.account_id = account_id
@@ -49,17 +56,28 @@ class Organizations: # pylint: disable=R0904
     def trim_scp_path(scp):
         return scp[2:] if scp.startswith('//') else scp
 
-    def get_organization_map(self, org_structure, counter=0):
-        for name, ou_id in org_structure.copy().items():
-            for organization_id in [organization_id['Id'] for organization_id in paginator(self.client.list_children, **{"ParentId":ou_id, "ChildType":"ORGANIZATIONAL_UNIT"})]:
-                if organization_id in org_structure.values() and counter != 0:
-                    continue
-                ou_name = self.describe_ou_name(organization_id)
-                trimmed_path = Organizations.trim_scp_path("{0}/{1}".format(name, ou_name))
-                org_structure[trimmed_path] = organization_id
-        counter = counter + 1
-        # Counter is greater than 4 here is the conditional as organizations cannot have more than 5 levels of nested OUs
-        return org_structure if counter > 4 else self.get_organization_map(org_structure, counter)
+    def get_organization_map(self, org_structure):
+        """
+        Adds the path and id of every OU below the OUs in org_structure with
+        a breadth first walk, one level at a time. The children of all OUs
+        in a level are listed concurrently, including their names, and the
+        walk stops at the first level without any OUs
+        """
+        level = list(org_structure.items())
+        with ThreadPoolExecutor(max_workers=ORGANIZATIONS_CONCURRENCY) as executor:
+            while level:
+                children = executor.map(
+                    lambda parent: list(self.get_child_ous(parent[1])),
+                    level
+                )
+                next_level = []
+                for (name, _), child_ous in zip(level, children):
+                    for ou in child_ous:
+                        trimmed_path = Organizations.trim_scp_path("{0}/{1}".format(name, ou['Name']))
+                        org_structure[trimmed_path] = ou['Id']
+                        next_level.append((trimmed_path, ou['Id']))
+                level = next_level
+        return org_structure
 
     def update_scp(self, content, policy_id):
         self.client.update_policy(
@@ -129,6 +147,11 @@ class Organizations: # pylint: disable=R0904
             self.account_ids.append(account['Id'])
         return self.account_ids
 
+    def describe_account(self, account_id):
+        return self.client.describe_account(
+            AccountId=account_id
+        ).get('Account')
+
     def get_organization_info(self):
         response = self.client.describe_organization()
         return {
@@ -198,13 +221,7 @@ class Organizations: # pylint: disable=R0904
 
         # While not at the root of the Organization
         while current.get('Type') != "ROOT":
-            # check cache for ou name of id
-            if not cache.check(current.get('Id')):
-                cache.add(
-                    current.get('Id'),
-                    self.describe_ou_name(
-                        current.get('Id')))
-            ou_name = cache.check(current.get('Id'))
+            ou_name = self._get_cached_ou_name(current.get('Id'), cache)
             account_path.append(ou_name)
             return self.build_account_path(
                 current.get('Id'),
@@ -213,7 +230,14 @@ class Organizations: # pylint: disable=R0904
             )
         return Organizations.determine_ou_path(
             '/'.join(list(reversed(account_path))),
-            self.describe_ou_name(
-                self.get_parent_info().get("ou_parent_id")
+            self._get_cached_ou_name(
+                self.get_parent_info().get("ou_parent_id"),
+                cache
             )
         )
+
+    def _get_cached_ou_name(self, ou_id, cache):
+        return cache.get_or_load(
+            ou_id,
+            lambda: self.describe_ou_name(ou_id)
+        )
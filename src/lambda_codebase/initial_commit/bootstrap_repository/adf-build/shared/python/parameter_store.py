@@ -4,27 +4,70 @@
 """Parameter Store module used throughout the ADF
 """
 
+from client_factory import get_client
 from errors import ParameterNotFoundError
 from paginator import paginator
+from logger import configure_logger
+
+LOGGER = configure_logger(__name__)
+
+# GetParameters accepts at most 10 names per call
+GET_PARAMETERS_BATCH_SIZE = 10
+
 
 class ParameterStore:
     """Class used for modeling Parameters
     """
 
-    def __init__(self, region, role):
-        self.client = role.client('ssm', region_name=region)
+    def __init__(self, region, role, cache=None):
+        """
+        An optional Cache can be passed in to act as a read-through cache
+        for parameter values, it can be shared between ParameterStore
+        instances of different regions.
+        """
+        self.region = region
+        self.client = get_client(role, 'ssm', region)
+        self.cache = cache
+
+    def _cache_key(self, name, with_decryption=False):
+        return (self.region, name, with_decryption)
 
     def put_parameter(self, name, value):
         """Puts a Parameter into Parameter Store
         """
-        return self.client.put_parameter(
+        response = self.client.put_parameter(
             Name=name,
             Description='DO NOT EDIT - Used by The AWS Deployment Framework',
             Value=value,
             Type='String',
             Overwrite=True)
+        if self.cache:
+            self.cache.add(self._cache_key(name), value)
+        return response
+
+    def put_parameters(self, parameters):
+        """Puts many Parameters into Parameter Store, only writing the ones
+        that are missing or whose value differs from what is stored
+        (Returns the number of writes skipped)
+        """
+        current = self.fetch_parameters(list(parameters), ignore_missing=True)
+        skipped = 0
+        for name, value in parameters.items():
+            if name in current and current[name] == value:
+                skipped += 1
+                continue
+            self.put_parameter(name, value)
+        LOGGER.info(
+            'Wrote %d and skipped %d unchanged Parameters in %s',
+            len(parameters) - skipped,
+            skipped,
+            self.region
+        )
+        return skipped
 
     def delete_parameter(self, name):
+        if self.cache:
+            self.cache.remove(self._cache_key(name))
         return self.client.delete_parameter(
             Name=name
         )
@@ -43,10 +86,51 @@ class ParameterStore:
                 'Parameter Path {0} Not Found'.format(path)
             )
 
+    def fetch_parameters(self, names, with_decryption=False, ignore_missing=False):
+        """Gets many Parameters from Parameter Store in batches of 10
+        (Returns a dict of name to value)
+        """
+        values = {}
+        pending = []
+        for name in sorted(set(names)):
+            cached = self.cache.check(self._cache_key(name, with_decryption)) if self.cache else None
+            if cached is not None:
+                values[name] = cached
+            else:
+                pending.append(name)
+
+        missing = []
+        for i in range(0, len(pending), GET_PARAMETERS_BATCH_SIZE):
+            response = self.client.get_parameters(
+                Names=pending[i:i + GET_PARAMETERS_BATCH_SIZE],
+                WithDecryption=with_decryption
+            )
+            for parameter in response['Parameters']:
+                values[parameter['Name']] = parameter['Value']
+                if self.cache:
+                    self.cache.add(
+                        self._cache_key(parameter['Name'], with_decryption),
+                        parameter['Value']
+                    )
+            missing.extend(response.get('InvalidParameters', []))
+
+        if missing and not ignore_missing:
+            raise ParameterNotFoundError(
+                'Parameter(s) {0} Not Found'.format(', '.join(sorted(missing)))
+            )
+        return values
 
     def fetch_parameter(self, name, with_decryption=False):
         """Gets a Parameter from Parameter Store (Returns the Value)
         """
+        if self.cache:
+            return self.cache.get_or_load(
+                self._cache_key(name, with_decryption),
+                lambda: self._get_parameter(name, with_decryption)
+            )
+        return self._get_parameter(name, with_decryption)
+
+    def _get_parameter(self, name, with_decryption):
         try:
             response = self.client.get_parameter(
                 Name=name,
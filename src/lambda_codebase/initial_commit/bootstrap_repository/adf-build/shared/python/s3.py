@@ -2,64 +2,308 @@
 # SPDX-License-Identifier: MIT-0
 
 """S3 module used throughout the ADF
+
+Object bodies read are cached by bucket and key along with their ETag
+and revalidated with a conditional GET, so unchanged objects are not
+downloaded again. In AWS Lambda the cache also spills to /tmp so warm
+containers reuse bodies across invocations.
 """
 
+import os
+import json
+import base64
+import hashlib
+import threading
+from urllib.parse import urlparse
 import boto3
 
+from botocore.exceptions import ClientError
+from cache import Cache
+from client_factory import get_client
 from logger import configure_logger
+from paginator import paginator
 
 
 LOGGER = configure_logger(__name__)
+OBJECT_CACHE = Cache(max_size=200)
+OBJECT_CACHE_DIR = os.environ.get(
+    'ADF_S3_CACHE_DIR',
+    '/tmp/adf-s3-cache' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else ''
+)
+# The conditions of a conditional write are sent as headers as the boto3
+# versions ADF runs with predate the IfMatch and IfNoneMatch parameters
+_WRITE_CONDITIONS = threading.local()
+
+
+def _add_write_conditions(params, **_):
+    params['headers'].update(getattr(_WRITE_CONDITIONS, 'headers', {}))
 
 
 class S3:
     """Class used for modeling S3
     """
 
-    def __init__(self, region, bucket):
+    def __init__(self, region, bucket, role=boto3, prefix=None):
+        """
+        When a prefix is given all keys are relative to it, so a copy of
+        the objects kept under prefix can be used in place of the originals
+        """
         self.region = region
-        self.client = boto3.client('s3', region_name=region)
-        self.resource = boto3.resource('s3', region_name=region)
+        self.client = get_client(role, 's3', region)
+        self.client.meta.events.register(
+            'before-call.s3.PutObject',
+            _add_write_conditions,
+            unique_id='adf-write-conditions'
+        )
         self.bucket = bucket
+        self.prefix = prefix
+        self._keys = None
+        self._resolved_keys = {}
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return '{0}/{1}'.format(self.prefix, key) if self.prefix else key
 
-    def put_object(self, key, file_path):
+    def get_key(self, url):
         """
-        Put the object into S3 and return the S3 URL of the object
+        Returns the key of the object at url, as returned by get_object_url,
+        or None if the object is not in the bucket (under prefix)
+        """
+        bucket, _, key = urlparse(url).path.lstrip('/').partition('/')
+        if bucket != self.bucket:
+            return None
+        if not self.prefix:
+            return key
+        return key[len(self.prefix) + 1:] if key.startswith(self.prefix + '/') else None
+
+    def _get_keys(self):
+        """
+        Returns the set of keys in the bucket, listed once per instance with
+        a single paginated list_objects_v2 call shared by all threads, or
+        None if the bucket cannot be listed
+        """
+        with self._lock:
+            if self._keys is None:
+                try:
+                    self._keys = set(
+                        s3_object['Key'][len(self._key('')):]
+                        for s3_object in paginator(
+                            self.client.list_objects_v2,
+                            Bucket=self.bucket,
+                            Prefix=self._key('')
+                        )
+                    )
+                except ClientError as error:
+                    LOGGER.warning(
+                        'Unable to list %s, searching for objects one key at a time: %s',
+                        self.bucket, error)
+                    self._keys = False
+            return None if self._keys is False else self._keys
+
+    def resolve_key(self, key):
+        """
+        Returns the key of the object found by searching from key up
+        towards the root of the bucket through the key index, or None if
+        nothing is found. Resolved keys are kept per OU path
+        """
+        keys = self._get_keys()
+        if keys is None:
+            found_key, _ = self._fetch_s3_object(key)
+            return found_key
+        with self._lock:
+            if key not in self._resolved_keys:
+                key_level_up = key.split('/')
+                while '/'.join(key_level_up) not in keys and len(key_level_up) > 1:
+                    del key_level_up[-2]
+                found_key = '/'.join(key_level_up)
+                self._resolved_keys[key] = found_key if found_key in keys else None
+            return self._resolved_keys[key]
+
+    def _add_key(self, key):
+        with self._lock:
+            if isinstance(self._keys, set):
+                self._keys.add(key)
+                self._resolved_keys = {}
+
+    def _remove_key(self, key):
+        with self._lock:
+            if isinstance(self._keys, set):
+                self._keys.discard(key)
+                self._resolved_keys = {}
+
+    def get_object_url(self, key):
+        """
+        Return the S3 URL of the object at key
         """
-        self.resource.Object(self.bucket, key).put(Body=open(file_path, 'rb'))
         if self.region == 'us-east-1':
             return "https://s3.amazonaws.com/{bucket}/{key}".format(
                 bucket=self.bucket,
-                key=key
+                key=self._key(key)
             )
         return "https://s3-{region}.amazonaws.com/{bucket}/{key}".format(
             region=self.region,
             bucket=self.bucket,
-            key=key
+            key=self._key(key)
         )
 
-    def read_object(self, key):
-        s3_object = self.resource.Object(self.bucket, key)
-        return s3_object.get()['Body'].read().decode('utf-8')
+    def _head_object(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as error:
+            if error.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return {}
+            raise
 
-    def fetch_s3_url(self, key):
-        """Recursively search for an object in S3 and return its URL
+    def put_object(self, key, body):
         """
+        Put body (bytes, a string or a readable stream) into S3 as the
+        object at key and return the S3 URL of the object, including its
+        version if the bucket is versioned. The PUT is skipped when the
+        existing object already has the same MD5 as ETag
+        """
+        if hasattr(body, 'read'):
+            body = body.read()
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        md5 = hashlib.md5(body)
+        existing = self._head_object(key)
+        if existing.get('ETag', '').strip('"') == md5.hexdigest():
+            LOGGER.debug('%s is unchanged, skipping upload', key)
+            response = existing
+        else:
+            response = self.client.put_object(
+                Bucket=self.bucket,
+                Key=self._key(key),
+                Body=body,
+                ContentMD5=base64.b64encode(md5.digest()).decode('utf-8')
+            )
+            self._add_key(key)
+        url = self.get_object_url(key)
+        if response.get('VersionId') not in (None, 'null'):
+            return '{0}?versionId={1}'.format(url, response['VersionId'])
+        return url
+
+    def _get_cache_path(self, key):
+        return os.path.join(
+            OBJECT_CACHE_DIR,
+            hashlib.sha256('{0}/{1}'.format(self.bucket, self._key(key)).encode('utf-8')).hexdigest()
+        )
 
+    def _get_cached_object(self, key):
+        """
+        Returns the cached (etag, body) of the object at key from memory
+        or from the spill directory, or None if it is not cached
+        """
+        cached = OBJECT_CACHE.check((self.bucket, self._key(key)))
+        if cached or not OBJECT_CACHE_DIR:
+            return cached
         try:
-            s3_object = self.resource.Object(self.bucket, key)
-            s3_object.get()
-            LOGGER.debug('Found Template at: %s', s3_object.key)
-            if self.region == 'us-east-1':
-                return "https://s3.amazonaws.com/{bucket}/{key}".format(
-                    bucket=self.bucket,
-                    key=key
+            with open(self._get_cache_path(key)) as cache_file:
+                content = json.load(cache_file)
+            return content['etag'], content['body']
+        except (IOError, ValueError, KeyError):
+            return None
+
+    def _cache_object(self, key, etag, body):
+        OBJECT_CACHE.add((self.bucket, self._key(key)), (etag, body))
+        if not OBJECT_CACHE_DIR:
+            return
+        try:
+            os.makedirs(OBJECT_CACHE_DIR, exist_ok=True)
+            path = self._get_cache_path(key)
+            # Written aside and renamed so readers never see a partial file
+            with open('{0}.{1}'.format(path, threading.get_ident()), 'w') as cache_file:
+                json.dump({'etag': etag, 'body': body}, cache_file)
+            os.replace('{0}.{1}'.format(path, threading.get_ident()), path)
+        except (IOError, OSError) as error:
+            LOGGER.debug('Unable to spill %s to %s: %s', key, OBJECT_CACHE_DIR, error)
+
+    def read_object(self, key):
+        """
+        Returns the body of the object at key, a cached body is
+        revalidated with a conditional GET on its ETag
+        """
+        return self.read_object_with_etag(key)[1]
+
+    def read_object_with_etag(self, key):
+        """
+        Returns the current (etag, body) of the object at key, the ETag
+        can be passed to write_object to only replace this version
+        """
+        cached = self._get_cached_object(key)
+        try:
+            if cached:
+                response = self.client.get_object(
+                    Bucket=self.bucket,
+                    Key=self._key(key),
+                    IfNoneMatch=cached[0]
                 )
-            return "https://s3-{region}.amazonaws.com/{bucket}/{key}".format(
-                region=self.region,
-                bucket=self.bucket,
-                key=key
+            else:
+                response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except ClientError as error:
+            if cached and error.response['Error']['Code'] in ('304', 'NotModified'):
+                OBJECT_CACHE.add((self.bucket, self._key(key)), cached)
+                return cached
+            raise
+        body = response['Body'].read().decode('utf-8')
+        self._cache_object(key, response['ETag'], body)
+        return response['ETag'], body
+
+    def write_object(self, key, body, if_match=None, if_none_match=None):
+        """
+        Put the string body into S3 as the object at key. With if_match the
+        object is only replaced if it still has that ETag, with
+        if_none_match='*' it is only written if it does not exist yet,
+        otherwise a ClientError with the code PreconditionFailed or
+        ConditionalRequestConflict is raised
+        """
+        conditions = {}
+        if if_match:
+            conditions['If-Match'] = if_match
+        if if_none_match:
+            conditions['If-None-Match'] = if_none_match
+        _WRITE_CONDITIONS.headers = conditions
+        try:
+            response = self.client.put_object(
+                Bucket=self.bucket,
+                Key=self._key(key),
+                Body=body.encode('utf-8')
             )
+        finally:
+            _WRITE_CONDITIONS.headers = {}
+        self._cache_object(key, response['ETag'], body)
+        self._add_key(key)
+
+    def delete_object(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+        OBJECT_CACHE.remove((self.bucket, self._key(key)))
+        if OBJECT_CACHE_DIR and os.path.exists(self._get_cache_path(key)):
+            os.remove(self._get_cache_path(key))
+        self._remove_key(key)
+
+    def fetch_s3_object(self, key):
+        """Search for an object in S3 from key up towards the root of the
+        bucket and return its key and body
+        """
+        if self._get_keys() is None:
+            return self._fetch_s3_object(key)
+        found_key = self.resolve_key(key)
+        if found_key is None:
+            LOGGER.debug(
+                'Nothing could be found for %s when traversing the bucket', key)
+            return None, None
+        return found_key, self.read_object(found_key)
+
+    def _fetch_s3_object(self, key):
+        """Recursively search for an object in S3 and return its key
+        and body, the body is read by the same GET that finds the object,
+        used when the bucket cannot be listed
+        """
+
+        try:
+            body = self.read_object(key)
+            LOGGER.debug('Found Template at: %s', key)
+            return key, body
         except self.client.exceptions.NoSuchKey:
             # Split the path to remove the last key entry from the string
             key_level_up = key.split('/')
@@ -69,7 +313,7 @@ class S3:
             if len(key_level_up) == 1:
                 LOGGER.debug(
                     'Nothing could be found for %s when traversing the bucket', key)
-                return []
+                return None, None
 
             LOGGER.debug(
                 'Unable to find the specified Key: %s - looking one level up', key)
@@ -80,4 +324,11 @@ class S3:
             # Join it back together, and recursive call the function with the
             # new trimmed key until a template/params is found
             next_level_up_key = '/'.join(key_level_up)
-            return self.fetch_s3_url(next_level_up_key)
+            return self._fetch_s3_object(next_level_up_key)
+
+    def fetch_s3_url(self, key):
+        """Search for an object in S3 from key up towards the root of the
+        bucket and return its URL
+        """
+        found_key = self.resolve_key(key)
+        return self.get_object_url(found_key) if found_key else []
@@ -0,0 +1,99 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Stack Events module used throughout the ADF
+
+Tails the events of a stack while it is being waited on and records
+when each of its resources started and finished, so the resources
+that dominate the time taken to create or update stacks can be found.
+Enabled by setting ADF_STACK_EVENTS to True as it costs an additional
+describe_stack_events call per stack each time it is polled.
+"""
+
+import os
+import json
+
+from logger import configure_logger
+from paginator import paginator
+
+LOGGER = configure_logger(__name__)
+STACK_EVENTS = os.environ.get('ADF_STACK_EVENTS', 'False') == 'True'
+
+
+class StackEvents:
+    """Class used for tailing the events of a single stack operation
+    """
+
+    def __init__(self, client, stack_name):
+        self.client = client
+        self.stack_name = stack_name
+        self.last_event_id = None
+        self.resources = {}
+
+    def _new_events(self):
+        """
+        Returns the events since the last poll, oldest first. Events are
+        listed newest first so only the pages up to the previously seen
+        event, or on the first poll the start of the stack operation, are read
+        """
+        events = []
+        for event in paginator(self.client.describe_stack_events, StackName=self.stack_name):
+            if event['EventId'] == self.last_event_id:
+                break
+            events.append(event)
+            if self.last_event_id is None \
+                    and event['LogicalResourceId'] == self.stack_name \
+                    and event.get('ResourceStatusReason') == 'User Initiated':
+                break
+        if events:
+            self.last_event_id = events[0]['EventId']
+        return list(reversed(events))
+
+    def poll(self):
+        for event in self._new_events():
+            if event['LogicalResourceId'] == self.stack_name:
+                continue
+            resource = self.resources.setdefault(event['LogicalResourceId'], {
+                'type': event.get('ResourceType'),
+                'started': event['Timestamp'],
+                'finished': None,
+                'status': None
+            })
+            resource['status'] = event['ResourceStatus']
+            if not event['ResourceStatus'].endswith('_IN_PROGRESS'):
+                resource['finished'] = event['Timestamp']
+
+    def get_timings(self):
+        """
+        Returns the seconds each resource took, slowest first,
+        resources that have not finished are left out
+        """
+        timings = [
+            {
+                'resource': logical_id,
+                'type': resource['type'],
+                'status': resource['status'],
+                'seconds': (resource['finished'] - resource['started']).total_seconds()
+            }
+            for logical_id, resource in self.resources.items()
+            if resource['finished'] is not None
+        ]
+        return sorted(timings, key=lambda timing: timing['seconds'], reverse=True)
+
+    def log_timings(self, account_id, region):
+        """
+        Logs the timing breakdown of the stack as a single JSON line
+        so it can be queried across accounts
+        """
+        LOGGER.info(
+            '%s - Stack %s in %s resource timings: %s',
+            account_id,
+            self.stack_name,
+            region,
+            json.dumps({
+                'account_id': account_id,
+                'region': region,
+                'stack_name': self.stack_name,
+                'resources': self.get_timings()
+            })
+        )
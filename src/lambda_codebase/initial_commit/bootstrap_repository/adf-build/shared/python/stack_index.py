@@ -0,0 +1,58 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Stack Index module used throughout the ADF
+"""
+
+import re
+
+from paginator import paginator
+
+
+class StackIndex:
+    """
+    Index of the stacks in an account and region, loaded with a single
+    paginated list_stacks call so the status of many stacks can be
+    looked up without describing each of them. It only pays off where
+    many stacks share an account and region, such as the pipelines in the
+    deployment account, a single stack is cheaper to describe
+    """
+    active_stack_status = [
+        'CREATE_IN_PROGRESS',
+        'CREATE_FAILED',
+        'CREATE_COMPLETE',
+        'ROLLBACK_IN_PROGRESS',
+        'ROLLBACK_FAILED',
+        'ROLLBACK_COMPLETE',
+        'DELETE_IN_PROGRESS',
+        'DELETE_FAILED',
+        'UPDATE_IN_PROGRESS',
+        'UPDATE_COMPLETE_CLEANUP_IN_PROGRESS',
+        'UPDATE_COMPLETE',
+        'UPDATE_ROLLBACK_IN_PROGRESS',
+        'UPDATE_ROLLBACK_FAILED',
+        'UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS',
+        'UPDATE_ROLLBACK_COMPLETE',
+        'REVIEW_IN_PROGRESS'
+    ]
+
+    def __init__(self, client, stack_status_filter=None):
+        self.stacks = {
+            stack['StackName']: stack
+            for stack in paginator(
+                client.list_stacks,
+                StackStatusFilter=stack_status_filter or StackIndex.active_stack_status
+            )
+        }
+
+    def has_stack(self, stack_name):
+        return stack_name in self.stacks
+
+    def get_stack_status(self, stack_name):
+        return self.stacks.get(stack_name, {}).get('StackStatus')
+
+    def get_stack_names(self, pattern=None):
+        return sorted(
+            stack_name for stack_name in self.stacks
+            if pattern is None or re.search(pattern, stack_name)
+        )
@@ -0,0 +1,208 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Stack Plan module used throughout the ADF
+
+Creates and executes the change sets of many stacks in two phases
+rather than taking each stack through create, wait, execute and wait
+in turn. The plan phase creates all change sets concurrently and waits
+on them together, the apply phase then executes every change set that
+contains changes concurrently, bounded per account and region.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from logger import configure_logger
+from stack_waiter import StackWaiter
+
+LOGGER = configure_logger(__name__)
+MAX_WORKERS = int(os.environ.get('ADF_STACK_PLAN_WORKERS', 10))
+MAX_PER_REGION = int(os.environ.get('ADF_STACK_APPLY_CONCURRENCY', 10))
+
+
+class PlannedChange:
+    """The planned change to a single stack
+    """
+    UP_TO_DATE = 'UP_TO_DATE'
+    NO_CHANGES = 'NO_CHANGES'
+    CREATE = 'CREATE'
+    UPDATE = 'UPDATE'
+    FAILED = 'FAILED'
+
+    def __init__(self, cloudformation):
+        self.cloudformation = cloudformation
+        self.action = None
+        self.changes = []
+        self.target = None
+        self.error = None
+
+    @property
+    def has_changes(self):
+        return self.action in (PlannedChange.CREATE, PlannedChange.UPDATE)
+
+    def to_dict(self):
+        return {
+            'account_id': self.cloudformation.account_id,
+            'region': self.cloudformation.region,
+            'stack_name': self.cloudformation.stack_name,
+            'action': self.action,
+            'changes': [
+                {
+                    key: change['ResourceChange'].get(key)
+                    for key in ('Action', 'LogicalResourceId', 'ResourceType', 'Replacement')
+                }
+                for change in self.changes
+                if change.get('Type') == 'Resource'
+            ],
+            'error': str(self.error) if self.error else None
+        }
+
+
+class StackPlan:
+    """Class used for planning and applying changes to many stacks at once
+    """
+
+    def __init__(self, stacks, executor=None, max_per_region=MAX_PER_REGION):
+        self.changes = [PlannedChange(stack) for stack in stacks]
+        self.executor = executor
+        self.max_per_region = max_per_region
+
+    def _map(self, function, items):
+        """
+        Calls function for each item on the shared executor if there
+        is one or a short lived pool otherwise, returns once all are done
+        """
+        if not items:
+            return
+        if self.executor:
+            futures = [self.executor.submit(function, item) for item in items]
+            for future in futures:
+                future.result()
+            return
+        with ThreadPoolExecutor(max_workers=min(len(items), MAX_WORKERS)) as executor:
+            list(executor.map(function, items))
+
+    @staticmethod
+    def _plan_change(change, stack_waiter):
+        try:
+            planned = change.cloudformation.plan_change_set(stack_waiter)
+        except Exception as error: # pylint: disable=W0703
+            change.action = PlannedChange.FAILED
+            change.error = error
+            return
+        if planned is None:
+            change.action = PlannedChange.UP_TO_DATE
+            return
+        change.action, change.target = planned
+
+    @staticmethod
+    def _resolve_change(change):
+        try:
+            description = change.cloudformation.resolve_change_set(change.target)
+        except Exception as error: # pylint: disable=W0703
+            change.action = PlannedChange.FAILED
+            change.error = error
+            return
+        if not description:
+            change.action = PlannedChange.NO_CHANGES
+            return
+        change.changes = description.get('Changes', [])
+
+    def _raise_first_failure(self):
+        for change in self.changes:
+            if change.error:
+                raise change.error
+
+    def plan(self, raise_on_failure=True):
+        """
+        Creates the change sets of all stacks concurrently and waits on
+        them together, returns the planned change of each stack
+        """
+        stack_waiter = StackWaiter()
+        self._map(lambda change: StackPlan._plan_change(change, stack_waiter), self.changes)
+        stack_waiter.wait(raise_on_failure=False)
+        for change in self.changes:
+            if change.target:
+                StackPlan._resolve_change(change)
+        LOGGER.info(
+            'Planned %d stacks - %d with changes, %d unchanged, %d failed',
+            len(self.changes),
+            len([change for change in self.changes if change.has_changes]),
+            len([change for change in self.changes
+                 if change.action in (PlannedChange.UP_TO_DATE, PlannedChange.NO_CHANGES)]),
+            len([change for change in self.changes if change.action == PlannedChange.FAILED])
+        )
+        if raise_on_failure and any(change.error for change in self.changes):
+            self.discard()
+            self._raise_first_failure()
+        return self.changes
+
+    def discard(self):
+        """
+        Deletes the planned change sets that contain changes without
+        executing them, so the next plan can create them afresh
+        """
+        self._map(
+            lambda change: change.cloudformation.discard_change_set(change.action),
+            [change for change in self.changes if change.has_changes]
+        )
+
+    def _waves(self, changes):
+        """
+        Splits the changes into waves holding at most max_per_region
+        stacks of any one account and region
+        """
+        groups = {}
+        for change in changes:
+            groups.setdefault(
+                (change.cloudformation.account_id, change.cloudformation.region),
+                []
+            ).append(change)
+        waves = []
+        for group in groups.values():
+            for index in range(0, len(group), self.max_per_region):
+                wave = index // self.max_per_region
+                if wave == len(waves):
+                    waves.append([])
+                waves[wave].extend(group[index:index + self.max_per_region])
+        return waves
+
+    @staticmethod
+    def _complete(change, on_complete):
+        try:
+            on_complete(change.cloudformation)
+        except Exception as error: # pylint: disable=W0703
+            change.error = error
+
+    @staticmethod
+    def _apply_change(change, stack_waiter):
+        try:
+            change.cloudformation.apply_change_set(change.action, stack_waiter)
+        except Exception as error: # pylint: disable=W0703
+            change.error = error
+
+    def apply(self, on_complete=None):
+        """
+        Executes the planned change sets that contain changes concurrently
+        and waits on them together, raises the first failure once all
+        waves have been applied. on_complete is called with each stack
+        that is up to date from the calling thread, stacks without changes
+        first and the others as soon as their own change set has completed
+        """
+        for change in self.changes:
+            if change.action == PlannedChange.NO_CHANGES:
+                change.cloudformation.record_template_digest()
+            if on_complete and change.action in (PlannedChange.UP_TO_DATE, PlannedChange.NO_CHANGES):
+                StackPlan._complete(change, on_complete)
+        for wave in self._waves([change for change in self.changes if change.has_changes]):
+            stack_waiter = StackWaiter(
+                on_success=(lambda target: on_complete(target.cloudformation)) if on_complete else None
+            )
+            self._map(lambda change, waiter=stack_waiter: StackPlan._apply_change(change, waiter), wave)
+            changes = {id(change.cloudformation): change for change in wave}
+            for target in stack_waiter.wait(raise_on_failure=False):
+                if target.error:
+                    changes[id(target.cloudformation)].error = target.error
+        self._raise_first_failure()
+        return self.changes
@@ -0,0 +1,336 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Stack Waiter module used throughout the ADF
+
+Waits for many CloudFormation stacks and change sets from a single
+thread. Targets that share a client (account and region) are polled
+together and the delay between polls starts small and backs off, so
+quick change sets are noticed within seconds while slow stacks are
+not polled needlessly often.
+"""
+
+import os
+import time
+import threading
+
+from botocore.exceptions import ClientError, WaiterError
+from logger import configure_logger
+from stack_index import StackIndex
+from stack_events import StackEvents, STACK_EVENTS
+
+LOGGER = configure_logger(__name__)
+INITIAL_DELAY = 2
+MAX_DELAY = 15
+BACKOFF = 1.5
+# The defaults match the botocore waiters used before, 45 and 20 attempts
+# 10 seconds apart, so a wait gives up at the same point as it used to
+STACK_DEADLINE = int(os.environ.get('ADF_STACK_WAIT_DEADLINE', 450))
+CHANGE_SET_DEADLINE = int(os.environ.get('ADF_CHANGE_SET_WAIT_DEADLINE', 200))
+# Seconds kept back from the time remaining to the caller so a WaiterError
+# is raised before eg: the AWS Lambda function waiting times out
+REMAINING_TIME_MARGIN = 15
+_CALLER_DEADLINE = {"deadline": None}
+
+SUCCESS_STATUS = {
+    'stack_create_complete': ['CREATE_COMPLETE'],
+    'stack_update_complete': ['UPDATE_COMPLETE'],
+    'stack_delete_complete': ['DELETE_COMPLETE'],
+    'change_set_create_complete': ['CREATE_COMPLETE']
+}
+PENDING_STATUS = {
+    'stack_create_complete': [
+        'CREATE_IN_PROGRESS',
+        'REVIEW_IN_PROGRESS',
+        'ROLLBACK_IN_PROGRESS'
+    ],
+    'stack_update_complete': [
+        'UPDATE_IN_PROGRESS',
+        'UPDATE_COMPLETE_CLEANUP_IN_PROGRESS',
+        'UPDATE_ROLLBACK_IN_PROGRESS',
+        'UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS'
+    ],
+    'stack_delete_complete': [
+        'DELETE_IN_PROGRESS'
+    ],
+    'change_set_create_complete': [
+        'CREATE_PENDING',
+        'CREATE_IN_PROGRESS'
+    ]
+}
+
+
+def set_remaining_time(remaining_time_in_millis):
+    """
+    Caps the deadline of the targets added from here on to the time
+    remaining to the caller, AWS Lambda functions pass
+    context.get_remaining_time_in_millis() at the start of each invocation
+    """
+    _CALLER_DEADLINE["deadline"] = time.time() \
+        + remaining_time_in_millis / 1000.0 - REMAINING_TIME_MARGIN
+
+
+def _get_deadline(seconds):
+    deadline = time.time() + seconds
+    if _CALLER_DEADLINE["deadline"] is None:
+        return deadline
+    return min(deadline, _CALLER_DEADLINE["deadline"])
+
+
+class WaitTarget:
+    """A stack or change set being waited on
+    """
+    def __init__(self, cloudformation, waiter_type, stack_name, deadline):
+        self.cloudformation = cloudformation
+        self.waiter_type = waiter_type
+        self.stack_name = stack_name
+        self.deadline = deadline
+        self.status = None
+        self.last_response = None
+        self.error = None
+        self.done = False
+        self.notified = False
+        self.events = None
+
+    @property
+    def is_change_set(self):
+        return self.waiter_type == 'change_set_create_complete'
+
+    def update(self, status, reason=None, last_response=None):
+        """
+        Records the latest status of the target, any status that is
+        neither the intended end state nor in progress towards it fails
+        """
+        self.status = status
+        self.last_response = last_response if last_response is not None else {
+            'Status': status,
+            'StatusReason': reason or ''
+        }
+        if status in SUCCESS_STATUS[self.waiter_type]:
+            self.done = True
+        elif status not in PENDING_STATUS[self.waiter_type]:
+            self.fail('{0} reached {1}: {2}'.format(self.stack_name, status, reason))
+
+    def fail(self, reason):
+        self.done = True
+        self.error = WaiterError(
+            name=self.waiter_type,
+            reason=reason,
+            last_response=self.last_response
+        )
+
+
+class StackWaiter:
+    """Class used for waiting on many stacks and change sets at once
+    """
+
+    def __init__(self, initial_delay=INITIAL_DELAY, max_delay=MAX_DELAY, on_success=None):
+        """
+        on_success is called from the waiting thread with each target as
+        soon as it has reached its intended end state, an error it raises
+        fails that target only
+        """
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.on_success = on_success
+        self.targets = []
+        self._lock = threading.Lock()
+
+    def _add(self, target):
+        with self._lock:
+            self.targets.append(target)
+        return target
+
+    def add_stack(
+            self,
+            cloudformation,
+            waiter_type,
+            stack_name=None,
+            deadline=STACK_DEADLINE,
+            events=STACK_EVENTS):
+        """
+        Adds a stack to wait on, when events is True the events of the
+        stack are tailed and its resource timings logged once it is done
+        """
+        LOGGER.info(
+            '%s - Waiting for CloudFormation stack: %s in %s to reach %s',
+            cloudformation.account_id,
+            stack_name or cloudformation.stack_name,
+            cloudformation.region,
+            waiter_type
+        )
+        target = WaitTarget(
+            cloudformation,
+            waiter_type,
+            stack_name or cloudformation.stack_name,
+            _get_deadline(deadline)
+        )
+        if events:
+            target.events = StackEvents(cloudformation.client, target.stack_name)
+        return self._add(target)
+
+    def add_change_set(self, cloudformation, deadline=CHANGE_SET_DEADLINE):
+        LOGGER.debug(
+            '%s - Determine CloudFormation Change Set: %s in %s',
+            cloudformation.account_id, cloudformation.stack_name, cloudformation.region)
+        return self._add(WaitTarget(
+            cloudformation,
+            'change_set_create_complete',
+            cloudformation.stack_name,
+            _get_deadline(deadline)
+        ))
+
+    def _pending_by_client(self):
+        groups = {}
+        for target in self.targets:
+            if not target.done:
+                groups.setdefault(id(target.cloudformation.client), []).append(target)
+        return groups.values()
+
+    @staticmethod
+    def _poll_change_set(target):
+        response = target.cloudformation.client.describe_change_set(
+            ChangeSetName=target.stack_name,
+            StackName=target.stack_name
+        )
+        target.update(response.get('Status'), response.get('StatusReason'), response)
+
+    @staticmethod
+    def _describe_stack(client, stack_name):
+        try:
+            return client.describe_stacks(StackName=stack_name)['Stacks'][0]
+        except ClientError as error:
+            if 'does not exist' in str(error):
+                return None
+            raise
+
+    @staticmethod
+    def _update_stack(target, stack):
+        if stack is None:
+            if target.waiter_type == 'stack_delete_complete':
+                target.update('DELETE_COMPLETE')
+            else:
+                target.fail('{0} does not exist'.format(target.stack_name))
+            return
+        target.update(stack['StackStatus'], stack.get('StackStatusReason'))
+        if target.done and not target.error and 'Outputs' in stack \
+                and target.stack_name == target.cloudformation.stack_name:
+            # Saves the stack from being described again for its outputs
+            target.cloudformation.set_stack_description(stack)
+
+    @staticmethod
+    def _fail_on_error(targets, error):
+        """
+        Fails only the targets the error was raised for so the others are
+        still waited on, throttled targets are polled again after backing off
+        """
+        if error.response['Error']['Code'] == 'Throttling':
+            LOGGER.debug('Throttled while waiting on stacks, backing off')
+            return
+        for target in targets:
+            target.fail('{0}: {1}'.format(target.stack_name, error))
+
+    @staticmethod
+    def _poll_stack(target):
+        try:
+            StackWaiter._update_stack(
+                target,
+                StackWaiter._describe_stack(target.cloudformation.client, target.stack_name)
+            )
+        except ClientError as error:
+            StackWaiter._fail_on_error([target], error)
+
+    def _poll_stacks(self, targets):
+        """
+        A single stack is described by name, the status of many stacks
+        sharing a client is read from one StackIndex and only the stacks
+        that have left their in progress state are then described
+        """
+        if len(targets) == 1:
+            StackWaiter._poll_stack(targets[0])
+            return
+        try:
+            stack_index = StackIndex(targets[0].cloudformation.client)
+        except ClientError as error:
+            StackWaiter._fail_on_error(targets, error)
+            return
+        for target in targets:
+            status = stack_index.get_stack_status(target.stack_name)
+            if status in PENDING_STATUS[target.waiter_type]:
+                target.update(status)
+            elif status:
+                StackWaiter._poll_stack(target)
+            else:
+                StackWaiter._update_stack(target, None)
+
+    @staticmethod
+    def _poll_events(target):
+        try:
+            target.events.poll()
+        except ClientError as error:
+            LOGGER.debug('Unable to read the events of %s: %s', target.stack_name, error)
+            return
+        if target.done:
+            target.events.log_timings(
+                target.cloudformation.account_id,
+                target.cloudformation.region
+            )
+
+    def _poll(self, targets):
+        for target in targets:
+            if target.is_change_set:
+                try:
+                    StackWaiter._poll_change_set(target)
+                except ClientError as error:
+                    StackWaiter._fail_on_error([target], error)
+        stacks = [target for target in targets if not target.is_change_set]
+        if stacks:
+            self._poll_stacks(stacks)
+        for target in stacks:
+            if target.events:
+                StackWaiter._poll_events(target)
+
+    def _notify(self):
+        for target in self.targets:
+            if not target.done or target.error or target.notified:
+                continue
+            target.notified = True
+            try:
+                self.on_success(target)
+            except Exception as error: # pylint: disable=W0703
+                LOGGER.error('%s - Completing %s in %s failed: %s',
+                             target.cloudformation.account_id,
+                             target.stack_name,
+                             target.cloudformation.region,
+                             error)
+                target.error = error
+
+    def wait(self, raise_on_failure=True):
+        """
+        Polls all targets until each has succeeded, failed or passed its
+        deadline and returns them, raising the first failure unless
+        raise_on_failure is False
+        """
+        delay = self.initial_delay
+        while True:
+            for targets in self._pending_by_client():
+                self._poll(targets)
+            if self.on_success:
+                self._notify()
+            now = time.time()
+            for target in self.targets:
+                if not target.done and target.deadline <= now:
+                    target.fail('{0} did not reach {1} before its deadline'.format(
+                        target.stack_name,
+                        target.waiter_type
+                    ))
+            pending = [target for target in self.targets if not target.done]
+            if not pending:
+                break
+            time.sleep(min(delay, max(min(target.deadline for target in pending) - now, 0)))
+            delay = min(delay * BACKOFF, self.max_delay)
+
+        failed = [target for target in self.targets if target.error]
+        if failed and raise_on_failure:
+            raise failed[0].error
+        return self.targets
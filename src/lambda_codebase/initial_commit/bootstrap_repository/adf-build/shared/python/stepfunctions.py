@@ -6,6 +6,7 @@
 
 import json
 from time import sleep
+from client_factory import get_client
 from logger import configure_logger
 
 
@@ -28,9 +29,10 @@ class StepFunctions:
             error=0
         ):
         self.deployment_account_region = deployment_account_region
-        self.client = role.client(
+        self.client = get_client(
+            role,
             'stepfunctions',
-            region_name=self.deployment_account_region
+            self.deployment_account_region
         )
         self.regions = regions
         self.deployment_account_id = deployment_account_id
@@ -4,28 +4,57 @@
 """STS module used throughout the ADF
 """
 
+from datetime import datetime, timezone
+
 import boto3
+from cache import Cache
+from client_factory import get_client
 from logger import configure_logger
 
 LOGGER = configure_logger(__name__)
 
+# Sessions are cached per (role_arn, role_session_name) until shortly
+# before their credentials expire, this includes warm AWS Lambda containers.
+# The least recently used are evicted to bound the cache in large Organizations
+SESSION_CACHE = Cache(max_size=500)
+# Seconds before the credentials expire at which a session is refreshed
+SESSION_REFRESH_MARGIN = 300
+
 
 class STS:
     """Class used for modeling STS
     """
 
     def __init__(self):
-        self.client = boto3.client('sts')
-
-    def assume_cross_account_role(self, role_arn, role_session_name):
-        """Assumes a role in another account and returns the temporary credentials
-        """
+        self.client = get_client(boto3, 'sts')
+
+    @staticmethod
+    def _session_ttl(cached):
+        _, expiration = cached
+        return max(
+            (expiration - datetime.now(timezone.utc)).total_seconds() - SESSION_REFRESH_MARGIN,
+            0
+        )
 
+    def _assume_role(self, role_arn, role_session_name):
+        LOGGER.debug('Assuming role %s with session name %s', role_arn, role_session_name)
         sts_response = self.client.assume_role(
             RoleArn=role_arn, RoleSessionName=role_session_name
         )
-
-        return boto3.Session(
+        session = boto3.Session(
             aws_access_key_id=sts_response['Credentials']['AccessKeyId'],
             aws_secret_access_key=sts_response['Credentials']['SecretAccessKey'],
             aws_session_token=sts_response['Credentials']['SessionToken'])
+        return session, sts_response['Credentials']['Expiration']
+
+    def assume_cross_account_role(self, role_arn, role_session_name):
+        """Assumes a role in another account and returns the temporary credentials.
+        The session is reused until shortly before the credentials expire
+        after which the role is assumed again.
+        """
+        session, _ = SESSION_CACHE.get_or_load(
+            (role_arn, role_session_name),
+            lambda: self._assume_role(role_arn, role_session_name),
+            ttl=STS._session_ttl
+        )
+        return session
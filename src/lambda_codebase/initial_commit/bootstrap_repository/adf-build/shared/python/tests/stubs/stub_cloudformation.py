@@ -17,3 +17,21 @@ describe_stack = {
         'StackStatus': 'CREATE_IN_PROGRESS'
     }]
 }
+
+get_template_summary = {
+    'Parameters': [{
+        'ParameterKey': 'KMSKey',
+        'DefaultValue': 'kms_arn',
+        'ParameterType': 'AWS::SSM::Parameter::Value<String>'
+    }, {
+        'ParameterKey': 'Environment',
+        'DefaultValue': 'testing',
+        'ParameterType': 'String'
+    }]
+}
+
+list_stacks = [
+    {'StackName': 'adf-global-base-banking', 'StackStatus': 'UPDATE_COMPLETE'},
+    {'StackName': 'adf-regional-base-banking', 'StackStatus': 'CREATE_IN_PROGRESS'},
+    {'StackName': 'adf-pipeline-sample', 'StackStatus': 'CREATE_COMPLETE'}
+]
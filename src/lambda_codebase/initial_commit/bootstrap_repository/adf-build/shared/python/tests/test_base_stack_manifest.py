@@ -0,0 +1,52 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# pylint: skip-file
+
+import boto3
+from pytest import fixture
+from mock import Mock
+
+from base_stack_manifest import BaseStackManifest
+from cloudformation import CloudFormation
+
+
+@fixture
+def cls():
+    s3 = Mock()
+    s3.fetch_s3_object.side_effect = lambda key: (key, 'some_template')
+    s3.get_object_url.side_effect = lambda key: 'https://some_bucket/{0}'.format(key)
+    s3.fetch_s3_url.return_value = []
+    return BaseStackManifest(s3, 'eu-central-1')
+
+
+def test_get_entry_resolves_once_per_ou_path(cls):
+    regional = [cls.get_entry('banking/testing', region) for region in ('eu-west-1', 'us-west-2')]
+    assert regional[0] is regional[1]
+    assert regional[0].stack_name == 'adf-regional-base-testing'
+    assert regional[0].template_url == 'https://some_bucket/banking/testing/regional.yml'
+    assert regional[0].parameters == []
+    global_entry = cls.get_entry('banking/testing', 'eu-central-1')
+    assert global_entry.stack_name == 'adf-global-base-testing'
+    assert global_entry is cls.get_entry('banking/testing', 'eu-central-1')
+    assert cls.s3.fetch_s3_object.call_count == 2
+
+
+def test_get_entry_keeps_ou_paths_apart(cls):
+    assert cls.get_entry('banking/testing', 'eu-west-1') is not cls.get_entry('insurance/testing', 'eu-west-1')
+
+
+def test_cloudformation_from_manifest_entry(cls):
+    entry = cls.get_entry('banking/testing', 'eu-central-1')
+    cloudformation = CloudFormation(
+        region='eu-central-1',
+        deployment_account_region='eu-central-1',
+        role=boto3,
+        s3=cls.s3,
+        s3_key_path='banking/testing',
+        manifest_entry=entry
+    )
+    assert cloudformation.stack_name == entry.stack_name
+    assert cloudformation.template_url == entry.template_url
+    assert cloudformation._get_template_body() == 'some_template'
+    assert cloudformation._get_template_hash() == entry.template_hash
@@ -3,7 +3,10 @@
 
 # pylint: skip-file
 
-from pytest import fixture
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pytest import fixture, raises
 from cache import Cache
 
 
@@ -19,3 +22,61 @@ def test_add(cls):
 def test_check(cls):
     cls.add('my_key', 'my_value')
     assert cls.check('my_key') == 'my_value'
+
+
+def test_check_missing(cls):
+    assert cls.check('my_key') is None
+    assert cls.stats()['misses'] == 1
+
+
+def test_ttl_expiry():
+    cls = Cache(ttl=0.01)
+    cls.add('my_key', 'my_value')
+    assert cls.check('my_key') == 'my_value'
+    time.sleep(0.02)
+    assert cls.check('my_key') is None
+
+
+def test_lru_eviction():
+    cls = Cache(max_size=2)
+    cls.add('a', 1)
+    cls.add('b', 2)
+    cls.check('a')
+    cls.add('c', 3)
+    assert cls.check('b') is None
+    assert cls.check('a') == 1
+    assert cls.check('c') == 3
+
+
+def test_get_or_load(cls):
+    assert cls.get_or_load('my_key', lambda: 'my_value') == 'my_value'
+    assert cls.get_or_load('my_key', lambda: 'other_value') == 'my_value'
+    assert cls.stats()['hits'] == 1
+    assert cls.stats()['misses'] == 1
+
+
+def test_get_or_load_single_flight(cls):
+    calls = []
+    started = threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.set()
+        time.sleep(0.05)
+        return 'my_value'
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        first = executor.submit(cls.get_or_load, 'my_key', loader)
+        started.wait()
+        others = [executor.submit(cls.get_or_load, 'my_key', loader) for _ in range(4)]
+        assert [f.result() for f in [first] + others] == ['my_value'] * 5
+    assert len(calls) == 1
+
+
+def test_get_or_load_error_is_not_cached(cls):
+    def loader():
+        raise ValueError('failed')
+
+    with raises(ValueError):
+        cls.get_or_load('my_key', loader)
+    assert cls.get_or_load('my_key', lambda: 'my_value') == 'my_value'
@@ -0,0 +1,73 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# pylint: skip-file
+
+import boto3
+from pytest import fixture
+from mock import Mock
+from cache import Cache
+import client_factory
+from client_factory import get_client, set_max_pool_connections
+
+DEFAULT_CLIENT_CACHE = client_factory.CLIENT_CACHE
+
+
+@fixture(autouse=True)
+def client_cache(monkeypatch):
+    monkeypatch.setattr(client_factory, 'CLIENT_CACHE', Cache())
+    yield
+    set_max_pool_connections(10)
+
+
+def session(access_key):
+    role = Mock()
+    role.get_credentials.return_value.access_key = access_key
+    role.client.side_effect = lambda *args, **kwargs: Mock()
+    return role
+
+
+def test_get_client_is_shared():
+    role = session('some_key')
+    assert get_client(role, 'ssm', 'eu-west-1') is get_client(role, 'ssm', 'eu-west-1')
+    assert role.client.call_count == 1
+
+
+def test_get_client_per_region_and_service():
+    role = session('some_key')
+    get_client(role, 'ssm', 'eu-west-1')
+    get_client(role, 'ssm', 'us-east-1')
+    get_client(role, 'cloudformation', 'eu-west-1')
+    assert role.client.call_count == 3
+
+
+def test_get_client_per_credentials():
+    assert get_client(session('some_key'), 'ssm', 'eu-west-1') is not get_client(
+        session('other_key'), 'ssm', 'eu-west-1'
+    )
+
+
+def test_get_client_default_credentials():
+    client = get_client(boto3, 'ssm', 'eu-west-1')
+    assert client is get_client(boto3, 'ssm', 'eu-west-1')
+    assert client.meta.config.max_pool_connections == 10
+
+
+def test_set_max_pool_connections():
+    set_max_pool_connections(50)
+    assert get_client(boto3, 'ssm', 'eu-west-1').meta.config.max_pool_connections == 50
+
+
+def test_client_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(client_factory, 'CLIENT_CACHE', Cache(max_size=2))
+    first = session('first_key')
+    client = get_client(first, 'ssm', 'eu-west-1')
+    get_client(session('second_key'), 'ssm', 'eu-west-1')
+    get_client(session('third_key'), 'ssm', 'eu-west-1')
+    assert client_factory.CLIENT_CACHE.stats()['size'] == 2
+    assert get_client(first, 'ssm', 'eu-west-1') is not client
+
+
+def test_default_client_cache_is_bounded():
+    assert DEFAULT_CLIENT_CACHE.max_size is not None
+    assert DEFAULT_CLIENT_CACHE.ttl is not None
@@ -5,11 +5,13 @@
 
 import os
 import boto3
-from pytest import fixture
+from pytest import fixture, raises
 from stubs import stub_cloudformation
-from mock import Mock
+from mock import Mock, patch
+from botocore.exceptions import ClientError, WaiterError
 
-from cloudformation import CloudFormation
+from cloudformation import CloudFormation, StackIndex, StackProperties, delete_base_stacks
+from parameter_store import ParameterStore
 from s3 import S3
 
 s3 = S3('us-east-1', 'some_bucket')
@@ -96,3 +98,259 @@ def test_get_waiter_type_create_complete(global_cls):
     global_cls.client = Mock()
     global_cls.client.describe_stacks.return_value = {'Stacks': []}
     assert global_cls._get_waiter_type() == 'stack_create_complete'
+
+
+@fixture
+def digest_cls(regional_cls):
+    regional_cls.client = Mock()
+    regional_cls.client.get_template_summary.return_value = stub_cloudformation.get_template_summary
+    regional_cls._get_template_body = Mock(return_value='some_template_body')
+    return regional_cls
+
+
+def test_get_template_digest_includes_resolved_parameters(digest_cls):
+    with patch.object(ParameterStore, 'fetch_parameters', return_value={'kms_arn': 'some_key_arn'}) as mock:
+        digest = digest_cls._get_template_digest([])
+        assert digest == digest_cls._get_template_digest([])
+        mock.assert_called_with(['kms_arn'], ignore_missing=True)
+    with patch.object(ParameterStore, 'fetch_parameters', return_value={'kms_arn': 'other_key_arn'}):
+        assert digest_cls._get_template_digest([]) != digest
+        assert digest_cls._get_template_digest(
+            [{'ParameterKey': 'Environment', 'ParameterValue': 'production'}]
+        ) != digest
+
+
+def test_create_stack_skips_when_digest_matches(digest_cls):
+    with patch.object(ParameterStore, 'fetch_parameters', return_value={'kms_arn': 'some_key_arn'}):
+        digest = digest_cls._get_template_digest([])
+    parameter_name = '/template_digest/{0}'.format(digest_cls.stack_name)
+    with patch.object(ParameterStore, 'fetch_parameters', return_value={
+        'kms_arn': 'some_key_arn',
+        parameter_name: digest
+    }):
+        digest_cls.client.describe_stacks.return_value = {'Stacks': [{'StackStatus': 'UPDATE_COMPLETE'}]}
+        digest_cls.parameters = []
+        digest_cls.create_stack()
+    digest_cls.client.create_change_set.assert_not_called()
+
+
+def test_create_stack_records_digest_in_parameter_store(digest_cls):
+    with patch.object(ParameterStore, 'fetch_parameters', return_value={'kms_arn': 'some_key_arn'}), \
+            patch.object(ParameterStore, 'put_parameter') as put_parameter:
+        digest_cls.client.describe_stacks.return_value = {'Stacks': [{'StackStatus': 'UPDATE_COMPLETE'}]}
+        digest_cls.client.describe_change_set.return_value = {'Status': 'CREATE_COMPLETE'}
+        digest_cls.parameters = []
+        digest_cls.create_stack()
+    # The digest is not a stack tag as those are copied onto every resource
+    assert digest_cls.client.create_change_set.call_args[1]['Tags'] == [{'Key': 'createdBy', 'Value': 'ADF'}]
+    put_parameter.assert_called_once_with(
+        '/template_digest/{0}'.format(digest_cls.stack_name),
+        digest_cls.template_digest
+    )
+
+
+def test_get_template_digest_includes_included_files(digest_cls):
+    digest_cls._get_template_body = Mock(return_value=(
+        'Fn::Transform:\n'
+        '  Name: AWS::Include\n'
+        '  Parameters:\n'
+        '    Location: s3://some_bucket/includes/resources.yml\n'
+    ))
+    with patch('cloudformation.get_client') as get_client, \
+            patch.object(ParameterStore, 'fetch_parameters', return_value={'kms_arn': 'some_key_arn'}):
+        get_client.return_value.head_object.return_value = {'ETag': '"abc"'}
+        digest = digest_cls._get_template_digest([])
+        get_client.return_value.head_object.assert_called_with(Bucket='some_bucket', Key='includes/resources.yml')
+        get_client.return_value.head_object.return_value = {'ETag': '"def"'}
+        assert digest_cls._get_template_digest([]) != digest
+
+
+def test_get_template_digest_unresolved_include(digest_cls):
+    digest_cls._get_template_body = Mock(return_value=(
+        'Transform:\n'
+        '  Name: AWS::Include\n'
+        '  Parameters:\n'
+        '    Location: !Sub s3://${Bucket}/resources.yml\n'
+    ))
+    with raises(ValueError):
+        digest_cls._get_included_etags(digest_cls._get_template_body())
+
+
+def test_validate_template_once_per_template_body(regional_cls):
+    regional_cls.client = Mock()
+    regional_cls.client.validate_template.return_value = {'Parameters': []}
+    regional_cls._get_template_body = Mock(return_value='some_validated_template_body')
+    assert regional_cls.validate_template() == {'Parameters': []}
+    assert regional_cls.validate_template() == {'Parameters': []}
+    other_cls = CloudFormation(
+        region='eu-west-1',
+        deployment_account_region='us-east-1',
+        role=boto3,
+        stack_name='other_stack',
+        template_url='https://some/path/regional.yml',
+        account_id=456
+    )
+    other_cls.client = regional_cls.client
+    other_cls._get_template_body = Mock(return_value='some_validated_template_body')
+    other_cls.validate_template()
+    assert regional_cls.client.validate_template.call_count == 1
+
+
+def test_validate_template_persisted(regional_cls):
+    regional_cls.client = Mock()
+    regional_cls.client.validate_template.return_value = {'Parameters': [], 'ResponseMetadata': {}}
+    regional_cls._get_template_body = Mock(return_value='some_persisted_template_body')
+    regional_cls.s3 = Mock()
+    regional_cls.s3.read_object.side_effect = ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+    regional_cls.validate_template()
+    key, body = regional_cls.s3.write_object.call_args[0]
+    assert key.startswith('adf-cache/validated-templates/')
+    assert body == '{"Parameters": []}'
+
+
+def test_stack_description_memoized(global_cls):
+    global_cls.client = Mock()
+    global_cls.client.describe_stacks.return_value = stub_cloudformation.describe_stack
+    global_cls._get_waiter_type()
+    global_cls._get_change_set_type()
+    global_cls.get_stack_regional_outputs()
+    assert global_cls.client.describe_stacks.call_count == 1
+    global_cls._execute_change_set('stack_update_complete')
+    global_cls.get_stack_status()
+    assert global_cls.client.describe_stacks.call_count == 2
+
+
+def test_get_stack_parameters(global_cls):
+    global_cls.client = Mock()
+    global_cls.client.describe_stacks.return_value = {'Stacks': [{
+        'StackStatus': 'CREATE_COMPLETE',
+        'Parameters': [{'ParameterKey': 'Environment', 'ParameterValue': 'testing'}]
+    }]}
+    assert global_cls.get_stack_parameters() == {'Environment': 'testing'}
+
+
+def test_stack_index():
+    with patch('stack_index.paginator', return_value=stub_cloudformation.list_stacks) as mock:
+        stack_index = StackIndex(Mock())
+    assert mock.call_args[1]['StackStatusFilter'] == StackIndex.active_stack_status
+    assert stack_index.get_stack_status('adf-global-base-banking') == 'UPDATE_COMPLETE'
+    assert stack_index.get_stack_status('adf-global-base-testing') is None
+    assert stack_index.get_stack_names('adf-(global|regional)-base') == [
+        'adf-global-base-banking', 'adf-regional-base-banking'
+    ]
+
+
+def test_get_stack_status_from_stack_index(global_cls):
+    global_cls.client = Mock()
+    with patch('stack_index.paginator', return_value=stub_cloudformation.list_stacks):
+        global_cls.stack_index = StackIndex(global_cls.client)
+    global_cls.stack_name = 'adf-regional-base-banking'
+    assert global_cls.get_stack_status() == 'CREATE_IN_PROGRESS'
+    global_cls.stack_name = 'adf-global-base-testing'
+    assert global_cls._get_change_set_type() == 'CREATE'
+    global_cls.client.describe_stacks.assert_not_called()
+
+
+def test_delete_all_base_stacks(global_cls):
+    global_cls.client = Mock()
+    with patch('stack_index.paginator', return_value=stub_cloudformation.list_stacks) as mock:
+        global_cls.delete_all_base_stacks()
+    assert mock.call_args[1]['StackStatusFilter'] == StackProperties.clean_stack_status
+    # Regional stacks are deleted before the global stacks
+    assert [c[1]['StackName'] for c in global_cls.client.delete_stack.call_args_list] == [
+        'adf-regional-base-banking', 'adf-global-base-banking'
+    ]
+
+
+def test_delete_base_stacks_across_regions(global_cls, regional_cls):
+    deleted = []
+    for cloudformation, stack_names in (
+            (global_cls, ['adf-global-base-banking']),
+            (regional_cls, ['adf-regional-base-banking'])):
+        cloudformation.get_base_stack_names = Mock(return_value=stack_names)
+        cloudformation.delete_stack = Mock(side_effect=lambda name, waiter: deleted.append((name, waiter)))
+    with patch('cloudformation.StackWaiter') as stack_waiter:
+        delete_base_stacks([global_cls, regional_cls])
+    assert [name for name, _ in deleted] == ['adf-regional-base-banking', 'adf-global-base-banking']
+    # One StackWaiter tracks the deletes of each phase
+    assert stack_waiter.call_count == 2
+    assert stack_waiter.return_value.wait.call_count == 2
+
+
+def test_create_stack_falls_back_when_digest_fails(digest_cls):
+    digest_cls._get_template_body = Mock(side_effect=ClientError({'Error': {'Code': 'AccessDenied'}}, 'GetObject'))
+    digest_cls.client.describe_stacks.return_value = {'Stacks': [{'StackStatus': 'UPDATE_COMPLETE'}]}
+    digest_cls.client.describe_change_set.return_value = {'Status': 'CREATE_COMPLETE'}
+    digest_cls.client.validate_template.return_value = {}
+    digest_cls.parameters = []
+    digest_cls.create_stack()
+    digest_cls.client.create_change_set.assert_called_once()
+
+
+def test_plan_and_apply_change_set(regional_cls):
+    regional_cls.client = Mock()
+    regional_cls.client.describe_stacks.return_value = {'Stacks': [{'StackStatus': 'UPDATE_COMPLETE'}]}
+    regional_cls.validate_template = Mock()
+    regional_cls.template_body = 'some_template'
+    regional_cls.parameters = []
+    regional_cls._stack_is_up_to_date = Mock(return_value=False)
+    stack_waiter = Mock()
+    change_set_type, target = regional_cls.plan_change_set(stack_waiter)
+    assert change_set_type == 'UPDATE'
+    assert target == stack_waiter.add_change_set.return_value
+    regional_cls.client.describe_change_set.assert_not_called()
+    target.error = None
+    target.last_response = {'Status': 'CREATE_COMPLETE', 'Changes': []}
+    assert regional_cls.resolve_change_set(target) == target.last_response
+    regional_cls.wait = True
+    regional_cls.apply_change_set(change_set_type, stack_waiter)
+    regional_cls.client.execute_change_set.assert_called_once()
+    stack_waiter.add_stack.assert_called_once_with(regional_cls, 'stack_update_complete')
+
+
+def test_resolve_change_set_reads_every_page(regional_cls):
+    regional_cls.client = Mock()
+    regional_cls.client.describe_change_set.side_effect = [
+        {'Status': 'CREATE_COMPLETE', 'Changes': [{'Type': 'Resource'}], 'NextToken': 'last'},
+        {'Status': 'CREATE_COMPLETE', 'Changes': [{'Type': 'Resource'}]}
+    ]
+    target = Mock()
+    target.error = None
+    target.last_response = {'Status': 'CREATE_COMPLETE', 'Changes': [{'Type': 'Resource'}], 'NextToken': 'next'}
+    description = regional_cls.resolve_change_set(target)
+    assert len(description['Changes']) == 3
+    assert 'NextToken' not in description
+    assert [c[1].get('NextToken') for c in regional_cls.client.describe_change_set.call_args_list] == ['next', 'last']
+
+
+def test_resolve_empty_change_set(regional_cls):
+    regional_cls.client = Mock()
+    target = Mock()
+    target.error = WaiterError('change_set_create_complete', 'failed', {
+        'Status': 'FAILED',
+        'StatusReason': "The submitted information didn't contain changes."
+    })
+    assert regional_cls.resolve_change_set(target) is False
+    regional_cls.client.delete_change_set.assert_called_once()
+
+
+def test_template_body_inline(regional_cls):
+    regional_cls.client = Mock()
+    regional_cls.template_body = 'some_template'
+    regional_cls._validate_template()
+    regional_cls.client.validate_template.assert_called_once_with(TemplateBody='some_template')
+    regional_cls.template_body = 'x' * 51201
+    regional_cls.parameters = []
+    regional_cls._submit_change_set('CREATE')
+    assert regional_cls.client.create_change_set.call_args[1]['TemplateURL'] == 'https://some/path/regional.yml'
+    assert 'TemplateBody' not in regional_cls.client.create_change_set.call_args[1]
+
+
+def test_get_template_url_reads_template_once(global_cls):
+    global_cls.s3 = Mock()
+    global_cls.s3.fetch_s3_object.return_value = ('some/location/global.yml', 'some_template')
+    global_cls.s3.get_object_url.return_value = 'https://some/location/global.yml'
+    global_cls.template_url = global_cls.get_template_url()
+    assert global_cls.template_url == 'https://some/location/global.yml'
+    assert global_cls._get_template_body() == 'some_template'
+    global_cls.s3.read_object.assert_not_called()
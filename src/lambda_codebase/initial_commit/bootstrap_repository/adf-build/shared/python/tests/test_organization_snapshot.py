@@ -0,0 +1,205 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# pylint: skip-file
+
+from pytest import fixture, raises
+from mock import Mock
+from botocore.exceptions import ClientError
+from errors import RootOUIDError
+from organization_snapshot import OrganizationSnapshot
+
+
+CHILD_OUS = {
+    'r-abc': [{'Id': 'ou-banking', 'Name': 'banking'}, {'Id': 'ou-deployment', 'Name': 'deployment'}],
+    'ou-banking': [{'Id': 'ou-testing', 'Name': 'testing'}],
+}
+
+ACCOUNTS = {
+    'r-abc': [{'Id': '111111111111', 'Name': 'master', 'Status': 'ACTIVE'}],
+    'ou-deployment': [{'Id': '222222222222', 'Name': 'deployment', 'Status': 'ACTIVE'}],
+    'ou-testing': [
+        {'Id': '333333333333', 'Name': 'test', 'Status': 'ACTIVE'},
+        {'Id': '444444444444', 'Name': 'closed', 'Status': 'SUSPENDED'}
+    ],
+}
+
+
+@fixture
+def organizations():
+    organizations = Mock()
+    organizations.get_ou_root_id.return_value = 'r-abc'
+    organizations.get_child_ous.side_effect = lambda parent_id: CHILD_OUS.get(parent_id, [])
+    organizations.get_accounts_for_parent.side_effect = lambda parent_id: ACCOUNTS.get(parent_id, [])
+    return organizations
+
+
+@fixture
+def cls(organizations):
+    return OrganizationSnapshot.crawl(organizations)
+
+
+def test_crawl_lists_each_parent_once(cls, organizations):
+    assert organizations.get_child_ous.call_count == 4
+    assert organizations.get_accounts_for_parent.call_count == 4
+
+
+def test_get_parent_info(cls):
+    assert cls.get_parent_info('333333333333') == {
+        "ou_parent_id": 'ou-testing',
+        "ou_parent_type": 'ORGANIZATIONAL_UNIT'
+    }
+    assert cls.get_parent_info('111111111111') == {
+        "ou_parent_id": 'r-abc',
+        "ou_parent_type": 'ROOT'
+    }
+
+
+def test_get_paths(cls):
+    assert cls.get_ou_path('ou-testing') == 'banking/testing'
+    assert cls.get_account_path('222222222222') == 'deployment'
+
+
+def test_describe_ou_name(cls):
+    assert cls.describe_ou_name('ou-testing') == 'testing'
+    with raises(RootOUIDError):
+        cls.describe_ou_name('r-abc')
+
+
+def test_dir_to_ou(cls):
+    assert [a['Id'] for a in cls.dir_to_ou('/banking/testing')] == ['333333333333', '444444444444']
+    with raises(Exception):
+        cls.dir_to_ou('/banking/production')
+
+
+def test_get_account_ids(cls):
+    assert sorted(cls.get_account_ids()) == ['111111111111', '222222222222', '333333333333']
+
+
+def test_get_organization_map(cls):
+    assert cls.get_organization_map() == {
+        '/': 'r-abc',
+        'banking': 'ou-banking',
+        'deployment': 'ou-deployment',
+        'banking/testing': 'ou-testing'
+    }
+
+
+class MockS3:
+    def __init__(self):
+        self.objects = {}
+        self.writes = 0
+        # Called before each write to simulate a concurrent writer
+        self.before_write = None
+        self._concurrent = False
+
+    def read_object_with_etag(self, key):
+        try:
+            return self.objects[key]
+        except KeyError:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+
+    def write_object(self, key, body, if_match=None, if_none_match=None):
+        if self.before_write and not self._concurrent:
+            self._concurrent = True
+            try:
+                self.before_write()
+            finally:
+                self._concurrent = False
+        etag = self.objects.get(key, (None, None))[0]
+        if (if_match and if_match != etag) or (if_none_match and etag):
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+        self.writes += 1
+        self.objects[key] = ('"{0}"'.format(self.writes), body)
+
+    def delete_object(self, key):
+        del self.objects[key]
+
+
+def test_save_and_load(cls):
+    s3 = MockS3()
+    cls.save(s3)
+    loaded = OrganizationSnapshot.load(s3)
+    assert loaded.get_organization_map() == cls.get_organization_map()
+    assert loaded.get_account_path('333333333333') == 'banking/testing'
+    assert sorted(loaded.get_account_ids()) == sorted(cls.get_account_ids())
+
+
+def test_load_missing():
+    assert OrganizationSnapshot.load(MockS3()) is None
+
+
+def test_load_expired(cls):
+    s3 = MockS3()
+    cls.crawled_at = cls.crawled_at - 7200
+    cls.save(s3)
+    assert OrganizationSnapshot.load(s3, ttl=3600) is None
+
+
+def test_fetch_warm(cls, organizations):
+    s3 = MockS3()
+    cls.save(s3)
+    organizations.reset_mock()
+    OrganizationSnapshot.fetch(organizations, s3)
+    assert organizations.get_child_ous.call_count == 0
+
+
+def test_fetch_cold(organizations):
+    s3 = MockS3()
+    snapshot = OrganizationSnapshot.fetch(organizations, s3)
+    assert OrganizationSnapshot.load(s3).get_organization_map() == snapshot.get_organization_map()
+
+
+def test_fetch_invalidates_when_changed_while_crawling(cls, organizations):
+    s3 = MockS3()
+    cls.crawled_at = cls.crawled_at - 7200
+    cls.save(s3)
+    s3.before_write = lambda: cls.save(s3)
+    OrganizationSnapshot.fetch(organizations, s3)
+    assert OrganizationSnapshot.load(s3) is None
+
+
+def test_move_account(cls):
+    s3 = MockS3()
+    cls.save(s3)
+    OrganizationSnapshot.move_account(s3, '333333333333', 'ou-deployment')
+    loaded = OrganizationSnapshot.load(s3)
+    assert loaded.get_account_path('333333333333') == 'deployment'
+    assert loaded.crawled_at == cls.crawled_at
+    assert [a['Id'] for a in loaded.dir_to_ou('banking/testing')] == ['444444444444']
+
+
+def test_move_account_retries_on_concurrent_write(cls):
+    s3 = MockS3()
+    cls.save(s3)
+
+    def concurrent_move():
+        s3.before_write = None
+        OrganizationSnapshot.move_account(s3, '444444444444', 'r-abc')
+    s3.before_write = concurrent_move
+    OrganizationSnapshot.move_account(s3, '333333333333', 'ou-deployment')
+    loaded = OrganizationSnapshot.load(s3)
+    # Neither move overwrote the other
+    assert loaded.get_account_path('333333333333') == 'deployment'
+    assert loaded.get_account_path('444444444444') == ''
+
+
+def test_move_account_invalidates_after_conflicts(cls):
+    s3 = MockS3()
+    cls.save(s3)
+    s3.before_write = lambda: cls.save(s3)
+    OrganizationSnapshot.move_account(s3, '333333333333', 'ou-deployment', attempts=2)
+    assert OrganizationSnapshot.load(s3) is None
+
+
+def test_move_account_to_unknown_ou_invalidates(cls):
+    s3 = MockS3()
+    cls.save(s3)
+    OrganizationSnapshot.move_account(s3, '333333333333', 'ou-new')
+    assert OrganizationSnapshot.load(s3) is None
+
+
+def test_move_account_without_snapshot():
+    s3 = MockS3()
+    OrganizationSnapshot.move_account(s3, '333333333333', 'ou-deployment')
+    assert s3.objects == {}
@@ -63,3 +63,19 @@ def test_build_account_path(cls):
     cls.client.describe_organizational_unit.return_value = stub_organizations.describe_organizational_unit
 
     assert cls.build_account_path('some_ou_id', [], cache) == 'some_ou_name'
+
+
+def test_get_organization_map(cls):
+    child_ous = {
+        'r-abc': [{'Id': 'ou-banking', 'Name': 'banking'}, {'Id': 'ou-deployment', 'Name': 'deployment'}],
+        'ou-banking': [{'Id': 'ou-testing', 'Name': 'testing'}],
+    }
+    cls.get_child_ous = Mock(side_effect=lambda parent_id: iter(child_ous.get(parent_id, [])))
+    assert cls.get_organization_map({'/': 'r-abc'}) == {
+        '/': 'r-abc',
+        'banking': 'ou-banking',
+        'deployment': 'ou-deployment',
+        'banking/testing': 'ou-testing'
+    }
+    # Each OU is listed once and the walk stops at the first empty level
+    assert cls.get_child_ous.call_count == 4
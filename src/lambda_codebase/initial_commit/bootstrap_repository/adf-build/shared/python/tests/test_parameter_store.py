@@ -5,10 +5,12 @@
 
 import os
 import boto3
-from pytest import fixture
+from pytest import fixture, raises
 from stubs import stub_parameter_store
 from mock import Mock
 
+from cache import Cache
+from errors import ParameterNotFoundError
 from parameter_store import ParameterStore
 
 
@@ -24,3 +26,74 @@ def test_fetch_parameter(cls):
     cls.client = Mock()
     cls.client.get_parameter.return_value = stub_parameter_store.get_parameter
     assert cls.fetch_parameter('some_path') == 'some_parameter_value'
+
+
+def _get_parameters(Names, WithDecryption):
+    return {
+        'Parameters': [
+            {'Name': name, 'Value': 'value_{0}'.format(name)}
+            for name in Names if name != 'missing'
+        ],
+        'InvalidParameters': [name for name in Names if name == 'missing']
+    }
+
+
+def test_fetch_parameters_batches(cls):
+    cls.client = Mock()
+    cls.client.get_parameters.side_effect = _get_parameters
+    names = ['name_{0}'.format(i) for i in range(25)]
+    parameters = cls.fetch_parameters(names)
+    assert cls.client.get_parameters.call_count == 3
+    assert parameters['name_7'] == 'value_name_7'
+    assert len(parameters) == 25
+
+
+def test_fetch_parameters_missing(cls):
+    cls.client = Mock()
+    cls.client.get_parameters.side_effect = _get_parameters
+    with raises(ParameterNotFoundError):
+        cls.fetch_parameters(['some_name', 'missing'])
+    assert cls.fetch_parameters(['some_name', 'missing'], ignore_missing=True) == {
+        'some_name': 'value_some_name'
+    }
+
+
+def test_fetch_parameters_cached(cls):
+    cls.cache = Cache(ttl=60)
+    cls.client = Mock()
+    cls.client.get_parameters.side_effect = _get_parameters
+    cls.fetch_parameters(['some_name', 'other_name'])
+    assert cls.fetch_parameter('some_name') == 'value_some_name'
+    assert cls.fetch_parameters(['other_name']) == {'other_name': 'value_other_name'}
+    assert cls.client.get_parameters.call_count == 1
+    cls.client.get_parameter.assert_not_called()
+
+
+def test_put_parameter_updates_cache(cls):
+    cls.cache = Cache(ttl=60)
+    cls.client = Mock()
+    cls.put_parameter('some_name', 'new_value')
+    assert cls.fetch_parameter('some_name') == 'new_value'
+    cls.client.get_parameter.assert_not_called()
+
+
+def test_put_parameters_skips_unchanged(cls):
+    cls.client = Mock()
+    cls.client.get_parameters.side_effect = _get_parameters
+    skipped = cls.put_parameters({
+        'some_name': 'value_some_name',
+        'other_name': 'new_value',
+        'missing': 'new_value'
+    })
+    assert skipped == 1
+    assert cls.client.put_parameter.call_count == 2
+    assert sorted(c[1]['Name'] for c in cls.client.put_parameter.call_args_list) == ['missing', 'other_name']
+
+
+def test_put_parameters_writes_missing(cls):
+    cls.client = Mock()
+    cls.client.get_parameters.side_effect = _get_parameters
+    skipped = cls.put_parameters({'missing': None})
+    assert skipped == 0
+    cls.client.put_parameter.assert_called_once()
+    assert cls.client.put_parameter.call_args[1]['Name'] == 'missing'
@@ -5,10 +5,13 @@
 
 import os
 import boto3
-from pytest import fixture
+import hashlib
+from pytest import fixture, raises
 from stubs import stub_s3
-from mock import Mock
+from mock import Mock, patch
+from botocore.exceptions import ClientError
 from s3 import S3
+from cache import Cache
 
 
 @fixture
@@ -18,3 +21,131 @@ def cls():
         'some_bucket'
     )
     return cls
+
+
+def test_fetch_s3_object_looks_one_level_up(cls):
+    cls.client = Mock()
+    # The bucket could not be listed
+    cls._keys = False
+    cls.client.exceptions.NoSuchKey = KeyError
+    bodies = {'adf-build/global.yml': 'some_template'}
+    cls.read_object = Mock(side_effect=lambda key: bodies[key])
+    assert cls.fetch_s3_object('adf-build/banking/global.yml') == ('adf-build/global.yml', 'some_template')
+    assert cls.fetch_s3_object('global.yml') == (None, None)
+    assert cls.fetch_s3_url('adf-build/banking/global.yml') == 'https://s3.amazonaws.com/some_bucket/adf-build/global.yml'
+
+
+def test_fetch_s3_object_from_key_index(cls):
+    cls.client = Mock()
+    cls.read_object = Mock(return_value='some_template')
+    with patch('s3.paginator', return_value=[
+            {'Key': 'global.yml'},
+            {'Key': 'banking/global.yml'},
+            {'Key': 'banking/testing/regional.yml'}]) as mock:
+        assert cls.fetch_s3_url('banking/testing/global.yml') == 'https://s3.amazonaws.com/some_bucket/banking/global.yml'
+        assert cls.fetch_s3_object('banking/testing/regional.yml') == ('banking/testing/regional.yml', 'some_template')
+        assert cls.fetch_s3_object('banking/testing/global-params.json') == (None, None)
+        assert cls.resolve_key('deployment/global.yml') == 'global.yml'
+    # The bucket is listed once and only the object found is read
+    assert mock.call_count == 1
+    cls.read_object.assert_called_once_with('banking/testing/regional.yml')
+
+
+def test_fetch_s3_object_without_list_access(cls):
+    cls.client = Mock()
+    cls.client.exceptions.NoSuchKey = KeyError
+    cls.read_object = Mock(side_effect=lambda key: {'global.yml': 'some_template'}[key])
+    with patch('s3.paginator', side_effect=ClientError({'Error': {'Code': 'AccessDenied'}}, 'ListObjectsV2')):
+        assert cls.fetch_s3_object('banking/global.yml') == ('global.yml', 'some_template')
+        assert cls.fetch_s3_url('banking/global.yml') == 'https://s3.amazonaws.com/some_bucket/global.yml'
+
+
+def test_write_object_updates_key_index(cls):
+    cls.client = Mock()
+    cls.client.put_object.return_value = {'ETag': '"abc"'}
+    with patch('s3.paginator', return_value=[{'Key': 'global.yml'}]), patch('s3.OBJECT_CACHE', Cache()):
+        assert cls.resolve_key('banking/global.yml') == 'global.yml'
+        cls.write_object('banking/global.yml', 'some_template')
+        assert cls.resolve_key('banking/global.yml') == 'banking/global.yml'
+        cls.delete_object('banking/global.yml')
+        assert cls.resolve_key('banking/global.yml') == 'global.yml'
+
+
+def test_write_object_sends_conditions(cls):
+    sent = []
+
+    def capture(request, **_):
+        sent.append(dict(request.headers))
+        raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'PutObject')
+    cls.client.meta.events.register('before-sign.s3.PutObject', capture)
+    with raises(ClientError):
+        cls.write_object('adf-cache/some.json', '{}', if_match='"abc"')
+    with raises(ClientError):
+        cls.write_object('adf-cache/some.json', '{}', if_none_match='*')
+    with raises(ClientError):
+        cls.write_object('adf-cache/some.json', '{}')
+    assert sent[0]['If-Match'] == '"abc"'
+    assert sent[1]['If-None-Match'] == '*'
+    assert 'If-Match' not in sent[2] and 'If-None-Match' not in sent[2]
+
+
+def test_read_object_revalidates_cached_body(cls, tmpdir):
+    cls.client = Mock()
+    cls.client.get_object.return_value = {'ETag': '"abc"', 'Body': Mock(read=Mock(return_value=b'some_template'))}
+    with patch('s3.OBJECT_CACHE', Cache()), patch('s3.OBJECT_CACHE_DIR', str(tmpdir)):
+        assert cls.read_object('global.yml') == 'some_template'
+        cls.client.get_object.side_effect = ClientError({'Error': {'Code': '304'}}, 'GetObject')
+        assert cls.read_object('global.yml') == 'some_template'
+        assert cls.client.get_object.call_args[1] == {'Bucket': 'some_bucket', 'Key': 'global.yml', 'IfNoneMatch': '"abc"'}
+        # A new container starts from the body spilled to disk
+        with patch('s3.OBJECT_CACHE', Cache()):
+            assert cls.read_object('global.yml') == 'some_template'
+        assert cls.client.get_object.call_count == 3
+
+
+def test_read_object_fetches_changed_body(cls):
+    cls.client = Mock()
+    cls.client.get_object.side_effect = [
+        {'ETag': '"abc"', 'Body': Mock(read=Mock(return_value=b'some_template'))},
+        {'ETag': '"def"', 'Body': Mock(read=Mock(return_value=b'some_other_template'))}
+    ]
+    with patch('s3.OBJECT_CACHE', Cache()), patch('s3.OBJECT_CACHE_DIR', ''):
+        assert cls.read_object('global.yml') == 'some_template'
+        assert cls.read_object('global.yml') == 'some_other_template'
+
+
+def test_put_object_uploads_changed_body(cls):
+    cls.client = Mock()
+    cls.client.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+    cls.client.put_object.return_value = {'ETag': '"abc"', 'VersionId': 'v2'}
+    assert cls.put_object('pipelines/sample/global.yml', 'some_template') == \
+        'https://s3.amazonaws.com/some_bucket/pipelines/sample/global.yml?versionId=v2'
+    put = cls.client.put_object.call_args[1]
+    assert put['Body'] == b'some_template'
+    assert put['ContentMD5'] == '55amIZth2deMLMp/cGoK0g=='
+
+
+def test_put_object_skips_unchanged_body(cls):
+    cls.client = Mock()
+    cls.client.head_object.return_value = {
+        'ETag': '"{0}"'.format(hashlib.md5(b'some_template').hexdigest()),
+        'VersionId': 'v1'
+    }
+    assert cls.put_object('pipelines/sample/global.yml', b'some_template') == \
+        'https://s3.amazonaws.com/some_bucket/pipelines/sample/global.yml?versionId=v1'
+    cls.client.put_object.assert_not_called()
+
+
+def test_prefix_keys_are_relative(cls):
+    cls.prefix = 'adf-plan/templates'
+    cls.client = Mock()
+    cls.client.get_object.return_value = {'ETag': '"abc"', 'Body': Mock(read=Mock(return_value=b'some_template'))}
+    with patch('s3.paginator', return_value=[{'Key': 'adf-plan/templates/global.yml'}]) as paginator, \
+            patch('s3.OBJECT_CACHE', Cache()):
+        assert cls.fetch_s3_object('banking/global.yml') == ('global.yml', 'some_template')
+        assert paginator.call_args[1]['Prefix'] == 'adf-plan/templates/'
+    assert cls.client.get_object.call_args[1]['Key'] == 'adf-plan/templates/global.yml'
+    url = cls.fetch_s3_url('banking/global.yml')
+    assert url == 'https://s3.amazonaws.com/some_bucket/adf-plan/templates/global.yml'
+    assert cls.get_key(url) == 'global.yml'
+    assert cls.get_key('https://s3.amazonaws.com/some_bucket/global.yml') is None
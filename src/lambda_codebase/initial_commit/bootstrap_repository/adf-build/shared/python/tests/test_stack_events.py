@@ -0,0 +1,68 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# pylint: skip-file
+
+from datetime import datetime, timedelta
+from mock import Mock, patch
+
+from stack_events import StackEvents
+from stack_waiter import StackWaiter
+
+START = datetime(2019, 1, 1)
+
+
+def event(event_id, logical_id, status, seconds, reason=None):
+    return {
+        'EventId': event_id,
+        'LogicalResourceId': logical_id,
+        'ResourceType': 'AWS::CloudFormation::Stack' if logical_id == 'some_stack' else 'AWS::KMS::Key',
+        'ResourceStatus': status,
+        'ResourceStatusReason': reason,
+        'Timestamp': START + timedelta(seconds=seconds)
+    }
+
+
+# Newest first, as returned by describe_stack_events
+FIRST_POLL = [
+    event('4', 'KMSKey', 'CREATE_IN_PROGRESS', 10),
+    event('3', 'some_stack', 'CREATE_IN_PROGRESS', 5, 'User Initiated'),
+    event('2', 'some_stack', 'UPDATE_COMPLETE', 0),
+    event('1', 'some_stack', 'UPDATE_IN_PROGRESS', -60, 'User Initiated')
+]
+SECOND_POLL = [
+    event('6', 'some_stack', 'CREATE_COMPLETE', 100),
+    event('5', 'KMSKey', 'CREATE_COMPLETE', 95)
+] + FIRST_POLL
+
+
+def test_poll_reads_only_new_events():
+    stack_events = StackEvents(Mock(), 'some_stack')
+    with patch('stack_events.paginator', return_value=iter(FIRST_POLL)):
+        stack_events.poll()
+    assert stack_events.last_event_id == '4'
+    assert stack_events.get_timings() == []
+    with patch('stack_events.paginator', return_value=iter(SECOND_POLL)):
+        stack_events.poll()
+    assert stack_events.last_event_id == '6'
+    assert stack_events.get_timings() == [{
+        'resource': 'KMSKey',
+        'type': 'AWS::KMS::Key',
+        'status': 'CREATE_COMPLETE',
+        'seconds': 85.0
+    }]
+
+
+def test_stack_waiter_logs_timings():
+    client = Mock()
+    client.describe_stacks.return_value = {'Stacks': [{'StackStatus': 'CREATE_COMPLETE'}]}
+    cloudformation = Mock()
+    cloudformation.client = client
+    cloudformation.stack_name = 'some_stack'
+    waiter = StackWaiter()
+    target = waiter.add_stack(cloudformation, 'stack_create_complete', events=True)
+    with patch('stack_events.paginator', return_value=iter(SECOND_POLL)), \
+            patch.object(StackEvents, 'log_timings') as log_timings:
+        waiter.wait()
+    assert target.events.get_timings()[0]['resource'] == 'KMSKey'
+    log_timings.assert_called_once_with(cloudformation.account_id, cloudformation.region)
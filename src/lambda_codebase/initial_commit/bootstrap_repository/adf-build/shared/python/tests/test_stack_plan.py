@@ -0,0 +1,128 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# pylint: skip-file
+
+from pytest import fixture, raises
+from mock import Mock, patch
+from botocore.exceptions import WaiterError
+
+from stack_plan import StackPlan, PlannedChange
+
+
+def stack(planned, description=None, region='eu-west-1', account_id='111111111111'):
+    cloudformation = Mock()
+    cloudformation.region = region
+    cloudformation.account_id = account_id
+    cloudformation.plan_change_set.return_value = planned
+    cloudformation.resolve_change_set.return_value = description
+    return cloudformation
+
+
+@fixture
+def stack_waiter():
+    with patch('stack_plan.StackWaiter') as mock:
+        mock.return_value.wait.return_value = []
+        yield mock.return_value
+
+
+def test_plan(stack_waiter):
+    up_to_date = stack(None)
+    empty = stack(('UPDATE', Mock()), False)
+    changed = stack(('CREATE', Mock()), {'Changes': [{'Type': 'Resource'}]})
+    changes = StackPlan([up_to_date, empty, changed]).plan()
+    assert [change.action for change in changes] == [
+        PlannedChange.UP_TO_DATE,
+        PlannedChange.NO_CHANGES,
+        PlannedChange.CREATE
+    ]
+    assert changes[2].changes == [{'Type': 'Resource'}]
+    stack_waiter.wait.assert_called_once_with(raise_on_failure=False)
+    up_to_date.resolve_change_set.assert_not_called()
+
+
+def test_plan_failure_discards_other_change_sets(stack_waiter):
+    changed = stack(('UPDATE', Mock()), {'Changes': []})
+    failed = stack(('UPDATE', Mock()))
+    failed.resolve_change_set.side_effect = WaiterError('change_set_create_complete', 'failed', {})
+    with raises(WaiterError):
+        StackPlan([changed, failed]).plan()
+    changed.discard_change_set.assert_called_once_with('UPDATE')
+    failed.discard_change_set.assert_not_called()
+
+
+def test_apply_only_executes_changes(stack_waiter):
+    up_to_date = stack(None)
+    changed = stack(('UPDATE', Mock()), {'Changes': []})
+    stack_plan = StackPlan([up_to_date, changed])
+    stack_plan.plan()
+    stack_plan.apply()
+    up_to_date.apply_change_set.assert_not_called()
+    changed.apply_change_set.assert_called_once_with('UPDATE', stack_waiter)
+
+
+def test_apply_waves_per_region(stack_waiter):
+    stacks = [
+        stack(('UPDATE', Mock()), {'Changes': []}, region=region)
+        for region in ['eu-west-1', 'eu-west-1', 'eu-west-1', 'us-east-1']
+    ]
+    stack_plan = StackPlan(stacks, max_per_region=2)
+    stack_plan.plan()
+    waves = stack_plan._waves(stack_plan.changes)
+    assert [[change.cloudformation.region for change in wave] for wave in waves] == [
+        ['eu-west-1', 'eu-west-1', 'us-east-1'],
+        ['eu-west-1']
+    ]
+    stack_plan.apply()
+    # One wait for the plan and one per wave
+    assert stack_waiter.wait.call_count == 3
+
+
+def test_apply_raises_after_all_waves(stack_waiter):
+    stacks = [stack(('UPDATE', Mock()), {'Changes': []}) for _ in range(2)]
+    stacks[0].apply_change_set.side_effect = WaiterError('stack_update_complete', 'failed', {})
+    stack_plan = StackPlan(stacks, max_per_region=1)
+    stack_plan.plan()
+    with raises(WaiterError):
+        stack_plan.apply()
+    stacks[1].apply_change_set.assert_called_once()
+
+
+def test_apply_completes_stacks_without_changes(stack_waiter):
+    up_to_date = stack(None)
+    failed = stack(('UPDATE', Mock()), {'Changes': []})
+    failed.apply_change_set.side_effect = WaiterError('stack_update_complete', 'failed', {})
+    completed = []
+    stack_plan = StackPlan([up_to_date, failed])
+    stack_plan.plan()
+    with raises(WaiterError):
+        stack_plan.apply(on_complete=completed.append)
+    assert completed == [up_to_date]
+
+
+def test_planned_change_to_dict(stack_waiter):
+    changed = stack(('UPDATE', Mock()), {'Changes': [{
+        'Type': 'Resource',
+        'ResourceChange': {
+            'Action': 'Modify',
+            'LogicalResourceId': 'KMSKey',
+            'ResourceType': 'AWS::KMS::Key',
+            'Replacement': 'False',
+            'Details': []
+        }
+    }]})
+    changed.stack_name = 'adf-regional-base-banking'
+    [change] = StackPlan([changed]).plan()
+    assert change.to_dict() == {
+        'account_id': '111111111111',
+        'region': 'eu-west-1',
+        'stack_name': 'adf-regional-base-banking',
+        'action': 'UPDATE',
+        'changes': [{
+            'Action': 'Modify',
+            'LogicalResourceId': 'KMSKey',
+            'ResourceType': 'AWS::KMS::Key',
+            'Replacement': 'False'
+        }],
+        'error': None
+    }
@@ -0,0 +1,205 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# pylint: skip-file
+
+import time
+
+from pytest import fixture, raises
+from mock import Mock, patch
+from botocore.exceptions import ClientError, WaiterError
+
+import stack_waiter
+from stack_waiter import StackWaiter
+
+
+def stack(client, stack_name='some_stack'):
+    cloudformation = Mock()
+    cloudformation.client = client
+    cloudformation.stack_name = stack_name
+    cloudformation.account_id = '111111111111'
+    cloudformation.region = 'eu-west-1'
+    return cloudformation
+
+
+def describe(*statuses):
+    return [{'Stacks': [{'StackStatus': status, 'Outputs': []}]} for status in statuses]
+
+
+@fixture
+def sleep():
+    with patch('stack_waiter.time.sleep') as mock:
+        yield mock
+
+
+def test_wait_backs_off(sleep):
+    client = Mock()
+    client.describe_stacks.side_effect = describe(
+        'UPDATE_IN_PROGRESS',
+        'UPDATE_IN_PROGRESS',
+        'UPDATE_IN_PROGRESS',
+        'UPDATE_COMPLETE'
+    )
+    cloudformation = stack(client)
+    waiter = StackWaiter(initial_delay=2, max_delay=4)
+    target = waiter.add_stack(cloudformation, 'stack_update_complete')
+    waiter.wait()
+    assert [c[0][0] for c in sleep.call_args_list] == [2, 3, 4]
+    assert target.done and target.error is None
+    cloudformation.set_stack_description.assert_called_once()
+
+
+def test_wait_raises_on_failed_status(sleep):
+    client = Mock()
+    client.describe_stacks.side_effect = describe('UPDATE_ROLLBACK_COMPLETE')
+    waiter = StackWaiter()
+    waiter.add_stack(stack(client), 'stack_update_complete')
+    with raises(WaiterError):
+        waiter.wait()
+
+
+def test_wait_fails_unknown_status(sleep):
+    client = Mock()
+    client.describe_change_set.return_value = {'Status': Mock()}
+    waiter = StackWaiter()
+    target = waiter.add_change_set(stack(client))
+    assert waiter.wait(raise_on_failure=False) == [target]
+    assert target.error is not None
+    sleep.assert_not_called()
+
+
+def test_wait_change_set_failure_keeps_response(sleep):
+    client = Mock()
+    client.describe_change_set.return_value = {
+        'Status': 'FAILED',
+        'StatusReason': "The submitted information didn't contain changes."
+    }
+    waiter = StackWaiter()
+    waiter.add_change_set(stack(client))
+    with raises(WaiterError) as error:
+        waiter.wait()
+    assert error.value.last_response['Status'] == 'FAILED'
+
+
+def test_wait_deadline(sleep):
+    client = Mock()
+    client.describe_stacks.return_value = describe('CREATE_IN_PROGRESS')[0]
+    waiter = StackWaiter()
+    target = waiter.add_stack(stack(client), 'stack_create_complete', deadline=0)
+    with raises(WaiterError):
+        waiter.wait()
+    assert 'deadline' in str(target.error)
+
+
+def test_wait_delete_does_not_exist(sleep):
+    client = Mock()
+    client.describe_stacks.side_effect = ClientError(
+        {'Error': {'Code': 'ValidationError', 'Message': 'Stack with id some_stack does not exist'}},
+        'DescribeStacks'
+    )
+    waiter = StackWaiter()
+    target = waiter.add_stack(stack(client), 'stack_delete_complete')
+    waiter.wait()
+    assert target.status == 'DELETE_COMPLETE'
+
+
+def test_wait_create_does_not_exist(sleep):
+    client = Mock()
+    client.describe_stacks.side_effect = ClientError(
+        {'Error': {'Code': 'ValidationError', 'Message': 'Stack with id some_stack does not exist'}},
+        'DescribeStacks'
+    )
+    waiter = StackWaiter()
+    waiter.add_stack(stack(client), 'stack_create_complete')
+    with raises(WaiterError):
+        waiter.wait()
+
+
+def test_wait_groups_stacks_per_client(sleep):
+    client = Mock()
+    other_client = Mock()
+    other_client.describe_stacks.return_value = describe('CREATE_COMPLETE')[0]
+    client.describe_stacks.side_effect = describe('UPDATE_COMPLETE') + [ClientError(
+        {'Error': {'Code': 'ValidationError', 'Message': 'Stack with id some_stack does not exist'}},
+        'DescribeStacks'
+    )]
+    list_stacks = [
+        {'StackName': 'adf-global-base-banking', 'StackStatus': 'UPDATE_COMPLETE'},
+        {'StackName': 'adf-regional-base-banking', 'StackStatus': 'DELETE_IN_PROGRESS'},
+        {'StackName': 'adf-regional-base-testing', 'StackStatus': 'UPDATE_IN_PROGRESS'}
+    ]
+    waiter = StackWaiter()
+    waiter.add_stack(stack(client, 'adf-global-base-banking'), 'stack_update_complete')
+    waiter.add_stack(stack(client, 'adf-regional-base-banking'), 'stack_delete_complete')
+    waiter.add_stack(stack(other_client), 'stack_create_complete')
+    with patch('stack_index.paginator', return_value=list_stacks) as mock:
+        waiter.wait()
+    # The stacks of the first client are read from one list_stacks and only
+    # the stack that finished is described, once a single stack is left
+    # pending it is described by name
+    assert mock.call_count == 1
+    assert client.describe_stacks.call_count == 2
+    assert other_client.describe_stacks.call_count == 1
+    assert all(target.done and not target.error for target in waiter.targets)
+
+
+def test_wait_fails_only_the_target_with_an_error(sleep):
+    client = Mock()
+    client.describe_change_set.side_effect = ClientError(
+        {'Error': {'Code': 'ValidationError', 'Message': 'Stack [some_stack] does not exist'}},
+        'DescribeChangeSet'
+    )
+    other_client = Mock()
+    other_client.describe_change_set.side_effect = [
+        {'Status': 'CREATE_IN_PROGRESS'},
+        {'Status': 'CREATE_COMPLETE'}
+    ]
+    waiter = StackWaiter()
+    failed = waiter.add_change_set(stack(client))
+    completed = waiter.add_change_set(stack(other_client))
+    waiter.wait(raise_on_failure=False)
+    assert 'does not exist' in str(failed.error)
+    assert completed.done and completed.error is None
+    assert other_client.describe_change_set.call_count == 2
+
+
+def test_wait_backs_off_when_throttled(sleep):
+    client = Mock()
+    client.describe_stacks.side_effect = [
+        ClientError({'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'}}, 'DescribeStacks')
+    ] + describe('CREATE_COMPLETE')
+    waiter = StackWaiter()
+    target = waiter.add_stack(stack(client), 'stack_create_complete')
+    waiter.wait()
+    assert target.done and target.error is None
+
+
+def test_wait_deadline_capped_to_remaining_time(sleep, monkeypatch):
+    monkeypatch.setattr(stack_waiter, '_CALLER_DEADLINE', {"deadline": None})
+    stack_waiter.set_remaining_time((stack_waiter.REMAINING_TIME_MARGIN + 60) * 1000)
+    waiter = StackWaiter()
+    target = waiter.add_change_set(stack(Mock()))
+    assert target.deadline <= time.time() + 60
+
+
+def test_wait_on_success(sleep):
+    client = Mock()
+    client.describe_stacks.side_effect = describe('UPDATE_IN_PROGRESS', 'UPDATE_COMPLETE')
+    other_client = Mock()
+    other_client.describe_stacks.return_value = describe('UPDATE_COMPLETE')[0]
+    succeeded = []
+
+    def on_success(target):
+        succeeded.append(target)
+        if target.cloudformation.client is other_client:
+            raise ValueError('some error')
+
+    waiter = StackWaiter(on_success=on_success)
+    first = waiter.add_stack(stack(client), 'stack_update_complete')
+    second = waiter.add_stack(stack(other_client), 'stack_update_complete')
+    with raises(ValueError):
+        waiter.wait()
+    # Each target is passed once, as soon as it has succeeded
+    assert succeeded == [second, first]
+    assert first.error is None
+    assert isinstance(second.error, ValueError)
@@ -0,0 +1,61 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# pylint: skip-file
+
+from datetime import datetime, timedelta, timezone
+from pytest import fixture
+from mock import Mock
+from cache import Cache
+import sts
+from sts import STS
+
+
+def assume_role_response(expires_in):
+    return {
+        'Credentials': {
+            'AccessKeyId': 'string',
+            'SecretAccessKey': 'string',
+            'SessionToken': 'string',
+            'Expiration': datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+        }
+    }
+
+
+@fixture
+def cls(monkeypatch):
+    monkeypatch.setattr(sts, 'SESSION_CACHE', Cache(max_size=2))
+    cls = STS()
+    cls.client = Mock()
+    return cls
+
+
+def test_assume_cross_account_role_reuses_session(cls):
+    cls.client.assume_role.return_value = assume_role_response(3600)
+    first = cls.assume_cross_account_role('arn:aws:iam::111111111111:role/some_role', 'some_session')
+    second = cls.assume_cross_account_role('arn:aws:iam::111111111111:role/some_role', 'some_session')
+    assert first is second
+    assert cls.client.assume_role.call_count == 1
+
+
+def test_assume_cross_account_role_per_session_name(cls):
+    cls.client.assume_role.return_value = assume_role_response(3600)
+    cls.assume_cross_account_role('arn:aws:iam::111111111111:role/some_role', 'some_session')
+    cls.assume_cross_account_role('arn:aws:iam::111111111111:role/some_role', 'other_session')
+    assert cls.client.assume_role.call_count == 2
+
+
+def test_assume_cross_account_role_refreshes_before_expiry(cls):
+    cls.client.assume_role.return_value = assume_role_response(sts.SESSION_REFRESH_MARGIN - 1)
+    cls.assume_cross_account_role('arn:aws:iam::111111111111:role/some_role', 'some_session')
+    cls.assume_cross_account_role('arn:aws:iam::111111111111:role/some_role', 'some_session')
+    assert cls.client.assume_role.call_count == 2
+
+
+def test_assume_cross_account_role_evicts_least_recently_used(cls):
+    cls.client.assume_role.return_value = assume_role_response(3600)
+    for account_id in ('111111111111', '222222222222', '333333333333'):
+        cls.assume_cross_account_role('arn:aws:iam::{0}:role/some_role'.format(account_id), 'some_session')
+    assert sts.SESSION_CACHE.stats()['size'] == 2
+    cls.assume_cross_account_role('arn:aws:iam::111111111111:role/some_role', 'some_session')
+    assert cls.client.assume_role.call_count == 4
@@ -76,3 +76,19 @@ def test_raise_validation_length_deployment_target(cls):
     cls.config_contents["regions"]["targets"] = []
     with raises(InvalidConfigError):
         assert cls._parse_config()
+
+
+def test_bootstrap_concurrency_default(cls):
+    assert cls.bootstrap_concurrency == 20
+
+
+def test_bootstrap_concurrency_from_config(cls):
+    cls.config_contents['config']['bootstrap-concurrency'] = '5'
+    cls._parse_config()
+    assert cls.bootstrap_concurrency == 5
+
+
+def test_raise_validation_bootstrap_concurrency(cls):
+    cls.config_contents['config']['bootstrap-concurrency'] = 0
+    with raises(InvalidConfigError):
+        assert cls._parse_config()
@@ -5,9 +5,10 @@
 
 import os
 
-from pytest import fixture
+from pytest import fixture, raises
 from parameter_store import ParameterStore
 from mock import Mock, patch, call
+from botocore.exceptions import WaiterError
 from main import *
 
 
@@ -62,10 +63,12 @@ def test_update_deployment_account_output_parameters(cls, sts):
         "kms_arn": 'some_kms_arn',
         "s3_regional_bucket": 'some_s3_bucket'
     }
-    with patch.object(ParameterStore, 'put_parameter') as mock:
+    with patch.object(ParameterStore, 'put_parameters') as mock:
         expected_calls = [
-            call('/cross_region/kms_arn/eu-central-1', 'some_kms_arn'),
-            call('/cross_region/s3_regional_bucket/eu-central-1', 'some_s3_bucket'),
+            call({
+                '/cross_region/kms_arn/eu-central-1': 'some_kms_arn',
+                '/cross_region/s3_regional_bucket/eu-central-1': 'some_s3_bucket'
+            })
         ]
         update_deployment_account_output_parameters(
             deployment_account_region='eu-central-1',
@@ -73,5 +76,127 @@ def test_update_deployment_account_output_parameters(cls, sts):
             deployment_account_role=sts,
             cloudformation=cloudformation
         )
-        assert 4 == mock.call_count
+        assert 2 == mock.call_count
         mock.assert_has_calls(expected_calls, any_order=True)
+
+
+def test_bootstrap_accounts(cls, sts):
+    def worker(account_id, *_):
+        return AccountBootstrapResult(account_id, AccountBootstrapResult.BOOTSTRAPPED)
+
+    with patch('main.worker_thread', side_effect=worker) as mock:
+        results = bootstrap_accounts(['111', '222', '333'], sts, cls, None, None)
+        assert 3 == mock.call_count
+        assert sorted([result.account_id for result in results]) == ['111', '222', '333']
+
+
+def test_bootstrap_accounts_raises_after_all_complete(cls, sts):
+    def worker(account_id, *_):
+        if account_id == '222':
+            raise GenericAccountConfigureError('some error')
+        return AccountBootstrapResult(account_id, AccountBootstrapResult.BOOTSTRAPPED)
+
+    with patch('main.worker_thread', side_effect=worker) as mock:
+        with raises(GenericAccountConfigureError):
+            bootstrap_accounts(['111', '222', '333'], sts, cls, None, None)
+        assert 3 == mock.call_count
+
+
+def test_create_base_stacks_global_first(cls):
+    created = []
+
+    def cloudformation(**kwargs):
+        stack = Mock()
+        stack.region = kwargs['region']
+        stack.create_stack.side_effect = lambda: created.append(kwargs['region'])
+        return stack
+
+    def stack_plan(stacks, **_):
+        plan = Mock()
+        plan.apply.side_effect = lambda **_: created.extend(stack.region for stack in stacks)
+        return plan
+
+    with patch('main.CloudFormation', side_effect=cloudformation) as mock, \
+            patch('main.StackPlan', side_effect=stack_plan):
+        create_base_stacks('111', Mock(), cls, None, 'some/path')
+        assert 3 == mock.call_count
+        assert created[0] == 'eu-central-1'
+        assert sorted(created[1:]) == ['eu-west-1', 'us-west-2']
+
+
+def test_create_base_stacks_on_complete(cls):
+    completed = []
+
+    def cloudformation(**kwargs):
+        stack = Mock()
+        stack.region = kwargs['region']
+        stack.account_id = '111'
+        stack.stack_name = 'adf-regional-base-deployment'
+        stack.client.describe_change_set.return_value = {'Status': 'CREATE_COMPLETE'}
+        stack.client.describe_stacks.return_value = {'Stacks': [{
+            'StackStatus': 'UPDATE_ROLLBACK_COMPLETE' if stack.region == 'us-west-2' else 'UPDATE_COMPLETE'
+        }]}
+        stack.plan_change_set.side_effect = lambda stack_waiter: ('UPDATE', stack_waiter.add_change_set(stack))
+        stack.resolve_change_set.return_value = {'Changes': [{'Type': 'Resource'}]}
+        stack.apply_change_set.side_effect = lambda _, stack_waiter: stack_waiter.add_stack(stack, 'stack_update_complete')
+        return stack
+
+    # The regional stacks are planned and applied through a StackPlan and
+    # StackWaiter, the stack in us-west-2 fails to update
+    with patch('main.CloudFormation', side_effect=cloudformation), \
+            patch('stack_waiter.time.sleep'):
+        with raises(WaiterError):
+            create_base_stacks(
+                '111', Mock(), cls, None, 'deployment',
+                on_complete=lambda stack: completed.append(stack.region)
+            )
+    assert completed == ['eu-central-1', 'eu-west-1']
+
+
+def test_create_base_stacks_plans_regional_stacks(cls):
+    executor = Mock()
+    with patch('main.CloudFormation'), patch('main.StackPlan') as stack_plan:
+        create_base_stacks('111', Mock(), cls, None, 'some/path', regional_executor=executor)
+        stacks = stack_plan.call_args[0][0]
+        assert 2 == len(stacks)
+        assert stack_plan.call_args[1] == {'executor': executor}
+        stack_plan.return_value.plan.assert_called_once_with(raise_on_failure=False)
+        stack_plan.return_value.apply.assert_called_once_with(on_complete=None)
+
+
+def test_plan_accounts(cls, sts):
+    snapshot = Mock()
+    snapshot.get_parent_info.side_effect = lambda account_id: {
+        'ou_parent_id': 'r-123' if account_id == '222' else 'ou-123'
+    }
+    snapshot.get_ou_path.return_value = 'banking/testing'
+
+    plans = []
+
+    def stack_plan(stacks, **_):
+        changes = []
+        for stack in stacks:
+            change = Mock()
+            change.action = 'UPDATE'
+            change.to_dict.return_value = {'account_id': stack.account_id}
+            changes.append(change)
+        plan = Mock()
+        plan.plan.return_value = changes
+        plans.append(plan)
+        return plan
+
+    with patch('main.CloudFormation') as cloudformation, \
+            patch('main.StackPlan', side_effect=stack_plan):
+        report = plan_accounts(['111', '222'], sts, cls, None, snapshot)
+        # The global and two regional stacks of the account that is not in the root
+        assert 3 == cloudformation.call_count
+    [plan] = plans
+    plan.plan.assert_called_once_with(raise_on_failure=False)
+    plan.discard.assert_called_once_with()
+    plan.apply.assert_not_called()
+    assert report['summary'] == {'UPDATE': 3}
+    assert report['skipped_accounts'] == [{
+        'account_id': '222',
+        'reason': 'Is in the Root of the Organization, it will be skipped.'
+    }]
+    assert len(report['stacks']) == 3
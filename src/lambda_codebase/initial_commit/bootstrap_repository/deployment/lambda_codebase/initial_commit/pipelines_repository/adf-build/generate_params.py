@@ -9,15 +9,18 @@
 import json
 import os
 import ast
+import glob
 import boto3
 
 from resolver import Resolver
+from cache import Cache
 from logger import configure_logger
 from parameter_store import ParameterStore
 
 LOGGER = configure_logger(__name__)
 DEPLOYMENT_ACCOUNT_REGION = os.environ.get("AWS_REGION", 'us-east-1')
 PROJECT_NAME = os.environ.get('PROJECT_NAME')
+PARAMETER_CACHE_TTL = int(os.environ.get('ADF_PARAMETER_CACHE_TTL', 300))
 
 
 class Parameters:
@@ -44,7 +47,45 @@ class Parameters:
         except FileExistsError:
             return None
 
+    def _find_resolve_values(self, params):
+        """
+        Returns all resolve: values within a parsed parameters file
+        """
+        if isinstance(params, dict):
+            params = params.values()
+        values = []
+        for value in params:
+            if isinstance(value, (dict, list)):
+                values.extend(self._find_resolve_values(value))
+            elif str(value).startswith('resolve:'):
+                values.append(str(value))
+        return values
+
+    def prefetch_parameter_store_values(self):
+        """
+        Fetches all resolve: values used in the params folder in batches
+        so the Resolver can read them from the cache one by one
+        """
+        names = {}
+        for filename in glob.glob('{0}/params/*.json'.format(self.cwd)):
+            for value in self._find_resolve_values(self._parse(filename)):
+                if value.count(':') > 1:
+                    [_, region, name] = value.split(':')
+                else:
+                    [_, name] = value.split(':')
+                    region = None
+                names.setdefault(region, set()).add(name)
+
+        for region, region_names in names.items():
+            parameter_store = self.parameter_store if region is None else ParameterStore(
+                region, boto3, cache=self.parameter_store.cache
+            )
+            LOGGER.info("Prefetching %d Parameters from %s", len(region_names), region or 'the deployment account region')
+            parameter_store.fetch_parameters(region_names, ignore_missing=True)
+
     def create_parameter_files(self):
+        if self.parameter_store.cache:
+            self.prefetch_parameter_store_values()
         global_params = self._parse(self.global_path)
         for acc, ou in self.account_ous.items():
             for region in self.regions:
@@ -180,7 +221,8 @@ def main():
         PROJECT_NAME,
         ParameterStore(
             DEPLOYMENT_ACCOUNT_REGION,
-            boto3
+            boto3,
+            cache=Cache(ttl=PARAMETER_CACHE_TTL)
         )
     )
     parameters.create_parameter_files()
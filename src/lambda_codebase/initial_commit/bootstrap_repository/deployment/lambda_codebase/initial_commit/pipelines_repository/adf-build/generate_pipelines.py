@@ -13,17 +13,20 @@ from pipeline import Pipeline
 from target import Target, TargetStructure
 from logger import configure_logger
 from deployment_map import DeploymentMap
-from cloudformation import CloudFormation
+from cloudformation import CloudFormation, StackIndex
+from stack_plan import StackPlan
+from client_factory import get_client
 from organizations import Organizations
+from organization_snapshot import OrganizationSnapshot
 from sts import STS
 from parameter_store import ParameterStore
+from errors import ParameterNotFoundError
 
 LOGGER = configure_logger(__name__)
 DEPLOYMENT_ACCOUNT_REGION = os.environ.get("AWS_REGION", 'us-east-1')
 DEPLOYMENT_ACCOUNT_ID = os.environ["ACCOUNT_ID"]
 MASTER_ACCOUNT_ID = os.environ.get("MASTER_ACCOUNT_ID", 'us-east-1')
 S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME")
-TARGET_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
 def clean(parameter_store, deployment_map):
     """
@@ -62,20 +65,36 @@ def store_regional_parameter_config(pipeline, parameter_store):
         str(list(set(Pipeline.flatten_list(pipeline.stage_regions))))
     )
 
-def upload_pipeline(s3, pipeline):
+def fetch_organization_snapshot(parameter_store, role):
     """
-    Responsible for uploading the object (global.yml) to S3
-    and returning the URL that can be referenced in the CloudFormation
-    create_stack call.
+    Starts from the Organization snapshot persisted in the bootstrap
+    bucket on the master account when it is still fresh, otherwise
+    crawls the Organization with the read only role.
     """
-    s3_object_path = s3.put_object(
-        "pipelines/{0}/global.yml".format(
-            pipeline.name), "{0}/{1}/{2}/global.yml".format(
-                TARGET_DIR,
-                'pipelines',
-                pipeline.name
+    organizations = Organizations(role)
+    try:
+        snapshot = OrganizationSnapshot.load(
+            S3(
+                DEPLOYMENT_ACCOUNT_REGION,
+                parameter_store.fetch_parameter('bootstrap_templates_bucket'),
+                role=role
             )
         )
+    except ParameterNotFoundError:
+        snapshot = None
+    return snapshot or OrganizationSnapshot.crawl(organizations)
+
+
+def upload_pipeline(s3, pipeline, template):
+    """
+    Responsible for uploading the rendered template (global.yml) to S3
+    and returning the URL that can be referenced in the CloudFormation
+    create_stack call. Unchanged templates are not uploaded again.
+    """
+    s3_object_path = s3.put_object(
+        "pipelines/{0}/global.yml".format(pipeline.name),
+        template
+    )
     return s3_object_path
 
 
@@ -100,8 +119,12 @@ def main(): #pylint: disable=R0915
         ), 'pipeline'
     )
 
-    organizations = Organizations(role)
+    organizations = fetch_organization_snapshot(parameter_store, role)
     clean(parameter_store, deployment_map)
+    stack_index = StackIndex(
+        get_client(boto3, 'cloudformation', DEPLOYMENT_ACCOUNT_REGION)
+    )
+    stacks = []
 
     for p in deployment_map.map_contents.get('pipelines'):
         pipeline = Pipeline(p)
@@ -126,9 +149,9 @@ def main(): #pylint: disable=R0915
             pipeline.stage_regions.append(DEPLOYMENT_ACCOUNT_REGION)
 
         parameters = pipeline.generate_parameters()
-        pipeline.generate()
+        template = pipeline.generate()
         deployment_map.update_deployment_parameters(pipeline)
-        s3_object_path = upload_pipeline(s3, pipeline)
+        s3_object_path = upload_pipeline(s3, pipeline, template)
 
         store_regional_parameter_config(pipeline, parameter_store)
         cloudformation = CloudFormation(
@@ -144,10 +167,16 @@ def main(): #pylint: disable=R0915
             ),
             s3=None,
             s3_key_path=None,
-            account_id=DEPLOYMENT_ACCOUNT_ID
+            account_id=DEPLOYMENT_ACCOUNT_ID,
+            stack_index=stack_index
         )
         cloudformation.validate_template()
-        cloudformation.create_stack()
+        stacks.append(cloudformation)
+
+    # The change sets of all pipelines are created before any is executed
+    stack_plan = StackPlan(stacks)
+    stack_plan.plan()
+    stack_plan.apply()
 
 
 if __name__ == '__main__':
@@ -65,13 +65,11 @@ class Pipeline:
                 result.append(i)
         return sorted(result)
 
-    def _create_pipelines_folder(self):
-        try:
-            return os.makedirs("pipelines/{0}".format(self.name))
-        except FileExistsError:
-            return None
-
     def generate(self):
+        """
+        Renders the pipeline template and returns it, it is uploaded
+        from memory rather than written to disk
+        """
         env = Environment(loader=FileSystemLoader('pipeline_types'))
         template = env.get_template('./{0}.yml.j2'.format(self.pipeline_type))
         output_template = template.render(
@@ -84,9 +82,4 @@ class Pipeline:
             action=self.action or self.replace_on_failure,
             contains_transform=self.contains_transform
         )
-
-        self._create_pipelines_folder()
-
-        output_path = "pipelines/{0}/global.yml".format(self.name)
-        with open(output_path, 'w') as file_handler:
-            file_handler.write(output_template)
+        return output_template
@@ -61,7 +61,11 @@ class Resolver:
     def fetch_parameter_store_value(self, value, key, param=None):
         if str(value).count(':') > 1:
             [_, region, value] = value.split(':')
-            regional_client = ParameterStore(region, boto3)
+            regional_client = ParameterStore(
+                region,
+                boto3,
+                cache=self.parameter_store.cache
+            )
             LOGGER.info("Fetching Parameter from %s", value)
             if param:
                 self.stage_parameters[param][key] = regional_client.fetch_parameter(
@@ -79,9 +79,7 @@ class Target():
             raise NoAccountsFoundError("No Accounts found in {0}".format(self.path))
 
     def _target_is_account_id(self):
-        responses = self.organizations.client.describe_account(
-            AccountId=str(self.path)
-        ).get('Account')
+        responses = self.organizations.describe_account(str(self.path))
         self._create_response_object([responses])
 
     def _target_is_ou_id(self):
@@ -60,7 +60,7 @@ def test_create_target_info_regex(cls):
 
 def test_target_is_account_id(cls):
     cls.organizations = Mock()
-    cls.organizations.client.describe_account.return_value = stub_target.organizations_describe_account
+    cls.organizations.describe_account.return_value = stub_target.organizations_describe_account.get('Account')
     cls._target_is_account_id()
 
     assert len(cls.target_structure.account_list) is 1
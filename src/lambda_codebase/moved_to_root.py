@@ -9,55 +9,41 @@ Organization
 
 import ast
 import os
-from thread import PropagatingThread
 import boto3
 
 from sts import STS
 from parameter_store import ParameterStore
 from logger import configure_logger
-from cloudformation import CloudFormation
+from cloudformation import CloudFormation, delete_base_stacks
+from stack_waiter import set_remaining_time
 
 LOGGER = configure_logger(__name__)
 REGION_DEFAULT = os.environ.get('AWS_REGION')
 S3_BUCKET = os.environ.get("S3_BUCKET_NAME")
 
 
-def worker_thread(sts, region, account_id, role, event):
-    role = sts.assume_cross_account_role(
+def remove_base(account_id, regions, role, event):
+    """
+    Removes the base stacks of the account in all regions, regional
+    stacks across every region first and the global stack after
+    """
+    role = STS().assume_cross_account_role(
         'arn:aws:iam::{0}:role/{1}'.format(account_id, role),
         'remove_base')
 
-    cloudformation = CloudFormation(
-        region=region,
-        deployment_account_region=event.get('deployment_account_region'),
-        role=role,
-        wait=True,
-        stack_name=None,
-        s3=None,
-        s3_key_path=None,
-        account_id=account_id
-    )
-    return cloudformation.delete_all_base_stacks()
-
-
-def remove_base(account_id, regions, role, event):
-    sts = STS()
-    threads = []
-
-    for region in list(set([event.get('deployment_account_region')] + regions)):
-        t = PropagatingThread(
-            target=worker_thread,
-            args=(
-                sts,
-                region,
-                account_id,
-                role,
-                event))
-        t.start()
-        threads.append(t)
-
-    for thread in threads:
-        thread.join()
+    delete_base_stacks([
+        CloudFormation(
+            region=region,
+            deployment_account_region=event.get('deployment_account_region'),
+            role=role,
+            wait=True,
+            stack_name=None,
+            s3=None,
+            s3_key_path=None,
+            account_id=account_id
+        )
+        for region in list(set([event.get('deployment_account_region')] + regions))
+    ])
 
 
 def execute_move_action(action, account_id, parameter_store, event):
@@ -72,7 +58,8 @@ def execute_move_action(action, account_id, parameter_store, event):
     return True
 
 
-def lambda_handler(event, _):
+def lambda_handler(event, context):
+    set_remaining_time(context.get_remaining_time_in_millis())
     parameter_store = ParameterStore(REGION_DEFAULT, boto3)
     configuration_options = ast.literal_eval(
         parameter_store.fetch_parameter('config')
@@ -35,21 +35,18 @@ def update_deployment_account_output_parameters(
     regional_parameter_store = ParameterStore(
         region, deployment_account_role
     )
+    outputs = {
+        "/cross_region/{0}/{1}".format(key, region): value
+        for key, value in cloudformation.get_stack_regional_outputs().items()
+    }
     # Regions needs to know to organization ID for Bucket Policy
-    regional_parameter_store.put_parameter(
-        "organization_id", os.environ['ORGANIZATION_ID']
-    )
-    # Regions needs to store its kms arn and s3 bucket in master and regional
-    for key, value in cloudformation.get_stack_regional_outputs().items():
-        LOGGER.info('Updating %s on deployment account in %s', key, region)
-        deployment_account_parameter_store.put_parameter(
-            "/cross_region/{0}/{1}".format(key, region),
-            value
-        )
-        regional_parameter_store.put_parameter(
-            "/cross_region/{0}/{1}".format(key, region),
-            value
-        )
+    # and to store its kms arn and s3 bucket in master and regional
+    LOGGER.info('Updating %s on deployment account in %s', ', '.join(outputs), region)
+    regional_parameter_store.put_parameters(dict(
+        outputs,
+        organization_id=os.environ['ORGANIZATION_ID']
+    ))
+    deployment_account_parameter_store.put_parameters(outputs)
 
 
 def lambda_handler(event, _):